@@ -1,24 +1,51 @@
-from flask import Flask, render_template, request, send_file, jsonify, redirect, url_for, flash, abort
+from flask import Flask, render_template, request, send_file, jsonify, redirect, url_for, flash, abort, \
+    Response, stream_with_context
 from flask_wtf import FlaskForm
-from wtforms import StringField, SubmitField, IntegerField, SelectField
-from wtforms.validators import DataRequired, Optional, NumberRange
+from wtforms import StringField, SubmitField, IntegerField, SelectField, BooleanField
+from wtforms.validators import DataRequired, Optional, NumberRange, ValidationError
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
-from datetime import datetime
-import threading
+import itertools
+import json
+from datetime import datetime, timedelta
 import time
 import traceback
 
 from parser.hh_api_parser import HHAPIParser as HHParser
-from parser.models import db, SearchQuery, Job
-from parser.utils import save_to_excel, save_to_csv, format_salary
+from parser.hh_async_client import get_client
+from parser.cache import create_cache
+from parser.models import db, SearchQuery, Job, Watchlist
+from parser.migrations import upgrade as upgrade_schema
+from parser.persistence import save_vacancies
+from parser.incremental import get_watermark, link_previous_results, update_watermark, newest_published
+from parser.queries import get_jobs_page, get_search_stats, iter_jobs_for_search, get_export_version, \
+    get_city_breakdown, get_linked_jobs
+from parser.export_cache import ExportCache, export_key
+from parser.scheduler import SearchScheduler, SearchJob, SchedulerFull
+from parser.progress import ProgressTracker
+from parser.sharding import ShardedCrawler
+from parser.fanout import MultiAreaSearch, split_cities
+from parser.areas import AreasUnavailable, get_area_index, preload_area_index, configure as configure_areas
+from parser.governor import RequestGovernor, CircuitOpen
+from parser.enrichment import VacancyEnricher, EnrichmentRunner
+from parser.fulltext import search_jobs
+from parser.analytics import ColumnarStore, AnalyticsUnavailable, salary_percentiles, posting_volume, \
+    top_employers
+from parser.watchlists import WatchlistRefresher, add_watchlist, find_fresh_search, parse_hours, \
+    settle_refreshes, WATCHLIST_USER, WATCHLIST_PRIORITY
+from parser.utils import iter_csv, write_excel_stream, content_disposition
 from config import Config
 
 app = Flask(__name__)
 app.config.from_object(Config)
+if app.config['TRUSTED_PROXIES']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'],
+                            x_proto=app.config['TRUSTED_PROXIES'])
 
 db.init_app(app)
 
 os.makedirs(app.config['DOWNLOAD_FOLDER'], exist_ok=True)
+export_cache = ExportCache(app.config['DOWNLOAD_FOLDER'], max_bytes=app.config['EXPORT_CACHE_MAX_BYTES'])
 
 try:
     db_uri = app.config['SQLALCHEMY_DATABASE_URI']
@@ -44,8 +71,86 @@ class SearchForm(FlaskForm):
     max_pages = IntegerField('Максимум страниц', default=3,
                              validators=[NumberRange(min=1, max=10)])
     format = SelectField('Формат файла', choices=[('excel', 'Excel'), ('csv', 'CSV')])
+    full_crawl = BooleanField('Полная выгрузка (все вакансии за 30 дней, без ограничения страниц)')
+    force_fresh = BooleanField('Искать заново, не открывать сохранённые результаты отслеживания')
+    watch = BooleanField('Отслеживать: обновлять результаты автоматически')
+    refresh_hours = SelectField('Обновлять', coerce=int, default=24,
+                                choices=[(6, 'каждые 6 часов'), (12, 'каждые 12 часов'),
+                                         (24, 'раз в день'), (168, 'раз в неделю')])
     submit = SubmitField('Найти вакансии')
 
+    def validate_city(self, field):
+        cities = split_cities(field.data)
+        if len(cities) > app.config['MAX_SEARCH_AREAS']:
+            raise ValidationError(f"Не более {app.config['MAX_SEARCH_AREAS']} городов в одном поиске")
+
+        try:
+            unknown = find_unknown_cities(cities)
+        except AreasUnavailable:
+            raise ValidationError("Справочник городов hh.ru сейчас недоступен, попробуйте позже "
+                                  "или выполните поиск без города")
+
+        for city, suggestions in unknown:
+            hint = f" Возможно, вы имели в виду: {', '.join(suggestions)}" if suggestions else ''
+            raise ValidationError(f"Город «{city}» не найден в справочнике hh.ru.{hint}")
+
+
+page_cache = create_cache(
+    app.config['HH_CACHE_BACKEND'],
+    ttl=app.config['HH_CACHE_TTL'],
+    max_entries=app.config['HH_CACHE_MAX_ENTRIES'],
+    path=app.config['HH_CACHE_PATH'],
+)
+
+
+progress = ProgressTracker()
+governor = RequestGovernor(
+    rate=app.config['HH_RATE_LIMIT'],
+    min_rate=app.config['HH_MIN_RATE'],
+    max_rate=app.config['HH_MAX_RATE'],
+    max_retries=app.config['HH_MAX_RETRIES'],
+    failure_threshold=app.config['HH_BREAKER_THRESHOLD'],
+    recovery_timeout=app.config['HH_BREAKER_TIMEOUT'],
+)
+configure_areas(app.config['HH_AREAS_PATH'], app.config['HH_AREAS_URL'])
+preload_area_index()
+
+
+def find_unknown_cities(cities):
+    if not cities:
+        return []
+    area_index = get_area_index()
+    unknown = []
+    for city in cities:
+        if area_index.resolve(city) is None:
+            unknown.append((city, [area['name'] for area in area_index.suggest(city, limit=5)]))
+    return unknown
+
+
+def create_parser():
+    if app.config['HH_ASYNC_CLIENT']:
+        return get_client(
+            max_workers=app.config['HH_MAX_WORKERS'],
+            rate_limit=app.config['HH_RATE_LIMIT'],
+            max_connections=app.config['HH_MAX_CONNECTIONS'],
+            governor=governor,
+            cache=page_cache,
+            api_url=app.config['HH_API_URL'],
+        )
+    return HHParser(
+        concurrent=app.config['HH_CONCURRENT_FETCH'],
+        max_workers=app.config['HH_MAX_WORKERS'],
+        rate_limit=app.config['HH_RATE_LIMIT'],
+        governor=governor,
+        cache=page_cache,
+        api_url=app.config['HH_API_URL'],
+    )
+
+
+def get_user_key():
+    # за доверенными прокси адрес клиента восстанавливает ProxyFix, сам заголовок X-Forwarded-For не читаем
+    return request.remote_addr or 'anonymous'
+
 
 def get_object_or_404(model, id):
     obj = db.session.get(model, id)
@@ -54,118 +159,181 @@ def get_object_or_404(model, id):
     return obj
 
 
-class ParserThread(threading.Thread):
-    def __init__(self, query, city, max_pages, search_id):
-        threading.Thread.__init__(self)
-        self.query = query
-        self.city = city
-        self.max_pages = max_pages
-        self.search_id = search_id
-        self.result = None
-
-    def run(self):
-        print(f"\n{'=' * 60}")
-        print(f" ЗАПУСК ПАРСЕРА В ФОНЕ")
-        print(f"   Запрос: {self.query}")
-        print(f"   Город: {self.city or 'Москва'}")
-        print(f"   Страниц: {self.max_pages}")
-        print(f"   ID поиска: {self.search_id}")
-        print(f"   Время: {datetime.now().strftime('%H:%M:%S')}")
-        print(f"{'=' * 60}")
+def save_search_pages(job, pages, area_id, date_from, track_watermark=True):
+    with app.app_context():
+        search = db.session.get(SearchQuery, job.search_id)
 
-        try:
-            parser = HHParser()
-            print(f" Парсер создан")
+        if not search:
+            print(f" Ошибка: поиск с ID {job.search_id} не найден в БД")
+            return None
 
-            print(f" Начинаем поиск вакансий...")
-            vacancies = parser.search_vacancies(self.query, self.city, self.max_pages)
+        previous = get_watermark(job.query, area_id, job.max_pages) if date_from else None
+        if previous:
+            link_previous_results(search.id, previous)
+            search.results_count = Job.by_search(search.id).count()
+            db.session.commit()
+            progress.update(search.id, results_count=search.results_count)
 
-            print(f" Найдено вакансий: {len(vacancies)}")
+        found_count = 0
+        saved_count = 0
+        newest = None
 
-            if vacancies:
+        for page, vacancies in enumerate(pages, 1):
+            if page == 1 and vacancies:
                 print(f" Пример вакансии:")
                 sample = vacancies[0]
                 print(f"   Название: {sample.get('title', 'Н/Д')}")
                 print(f"   Компания: {sample.get('company', 'Н/Д')}")
                 print(f"   Зарплата: {sample.get('salary', 'Н/Д')}")
                 print(f"   Город: {sample.get('city', 'Н/Д')}")
+
+            try:
+                inserted, linked, skipped = save_vacancies(search.id, vacancies)
+                search.results_count = Job.by_search(search.id).count()
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f" Ошибка при коммите в БД: {e}")
+                raise
+
+            found_count += len(vacancies)
+            saved_count += inserted
+            progress.advance(search.id, pages=1, vacancies=len(vacancies), saved=inserted,
+                             results_count=search.results_count)
+            newest = newest_published(vacancies, newest)
+            print(f"    Страница {page}: новых {inserted}, привязано {linked}, пропущено {skipped}")
+
+        if track_watermark and app.config['INCREMENTAL_SEARCH'] and (found_count or previous):
+            update_watermark(job.query, area_id, job.max_pages, search.id, newest, previous)
+            db.session.commit()
+
+        return found_count, saved_count
+
+
+def run_search(job):
+    print(f"\n{'=' * 60}")
+    print(f" ЗАПУСК ПАРСЕРА В ФОНЕ")
+    print(f"   Запрос: {job.query}")
+    print(f"   Город: {job.city or 'Москва'}")
+    print(f"   Страниц: {job.max_pages}")
+    print(f"   ID поиска: {job.search_id}")
+    print(f"   Время: {datetime.now().strftime('%H:%M:%S')}")
+    print(f"{'=' * 60}")
+
+    try:
+        parser = create_parser()
+        print(f" Парсер создан")
+
+        cities = split_cities(job.city)
+        area_id = parser._get_city_id(cities[0]) if cities else 1
+
+        if job.full_crawl or len(cities) > 1:
+            area_ids = MultiAreaSearch(parser).resolve_areas(cities) or [area_id]
+            if job.full_crawl:
+                print(f" Полная выгрузка с разбиением запроса на шарды, регионы: {area_ids}")
+                crawler = ShardedCrawler(parser)
+                pages = itertools.chain.from_iterable(
+                    crawler.iter_pages(job.query, area_id=area) for area in area_ids)
             else:
-                print(f" Вакансии не найдены!")
-                if self.city:
-                    print(f" Пробуем поиск в Москве...")
-                    vacancies = parser.search_vacancies(self.query, "Москва", self.max_pages)
-                    print(f" Найдено вакансий в Москве: {len(vacancies)}")
-
-            if vacancies:
-                with app.app_context():
-                    print(f" Сохраняем в базу данных...")
-                    search = db.session.get(SearchQuery, self.search_id)
-
-                    if not search:
-                        print(f" Ошибка: поиск с ID {self.search_id} не найден в БД")
-                        return
-
-                    print(f" Найден поисковый запрос: {search.query}")
-
-                    saved_count = 0
-                    for i, vac in enumerate(vacancies, 1):
-                        try:
-                            title = vac.get('title', '')
-                            if not title or len(title.strip()) < 2:
-                                print(f"    Пропущена вакансия {i}: нет названия")
-                                continue
-
-                            job = Job(
-                                title=title[:200],
-                                company=vac.get('company', 'Не указано')[:200],
-                                salary=vac.get('salary', 'Не указана')[:100],
-                                city=vac.get('city', 'Не указан')[:100],
-                                experience=vac.get('experience', '')[:100],
-                                url=vac.get('url', '')[:500] if vac.get('url') else '',
-                                published_at=vac.get('published_at', datetime.now()),
-                                description=str(vac.get('description', ''))[:1000] if vac.get('description') else '',
-                                search_query_id=search.id
-                            )
-
-                            existing = Job.query.filter_by(url=job.url).first()
-                            if existing:
-                                print(f"    Вакансия {i} уже существует в БД, пропускаем")
-                                continue
-
-                            db.session.add(job)
-                            saved_count += 1
-
-                            if saved_count % 5 == 0:
-                                print(f"    Сохранено {saved_count} вакансий...")
-                                db.session.flush()
-
-                        except Exception as e:
-                            print(f"    Ошибка при сохранении вакансии {i}: {e}")
-                            continue
-                    search.results_count = saved_count
-
-                    try:
-                        db.session.commit()
-                        print(f" УСПЕШНО сохранено {saved_count} вакансий в БД")
-                    except Exception as e:
-                        db.session.rollback()
-                        print(f" Ошибка при коммите в БД: {e}")
-
-                    self.result = vacancies
-            else:
-                print(f" Нет вакансий для сохранения")
+                print(f" Поиск по {len(area_ids)} регионам: {', '.join(cities)}")
+                pages = MultiAreaSearch(parser).iter_pages(job.query, cities, job.max_pages)
+
+            result = save_search_pages(job, pages, area_id, None, track_watermark=False)
+            if result:
+                print(f" УСПЕШНО обработано {result[0]} вакансий, новых в БД: {result[1]}")
+            print(f"{'=' * 60}\n")
+            return
+
+        date_from = None
+        if app.config['INCREMENTAL_SEARCH']:
+            with app.app_context():
+                watermark = get_watermark(job.query, area_id, job.max_pages)
+                if watermark:
+                    date_from = watermark.newest_published_at
+                    print(f" Инкрементальный поиск: вакансии новее {date_from} "
+                          f"(предыдущий поиск {watermark.last_search_id})")
+
+        print(f" Начинаем поиск вакансий...")
+        pages = parser.iter_pages(job.query, job.city, job.max_pages, date_from=date_from)
+        result = save_search_pages(job, pages, area_id, date_from)
+        if result is None:
+            return
+
+        if result[0]:
+            print(f" УСПЕШНО обработано {result[0]} вакансий, новых в БД: {result[1]}")
+        elif date_from:
+            print(f" Новых вакансий нет")
+        else:
+            print(f" Вакансии не найдены!")
 
-        except Exception as e:
-            print(f" КРИТИЧЕСКАЯ ОШИБКА В ПАРСЕРЕ: {e}")
-            import traceback
-            traceback.print_exc()
-            self.result = []
+    except Exception as e:
+        print(f" КРИТИЧЕСКАЯ ОШИБКА В ПАРСЕРЕ: {e}")
+        traceback.print_exc()
+        raise
+
+    print(f"{'=' * 60}\n")
+
+analytics_store = ColumnarStore(app.config['ANALYTICS_PATH'])
+
+
+def mirror_search(search_id):
+    if not app.config['ANALYTICS_MIRROR']:
+        return
+    try:
+        with app.app_context():
+            analytics_store.mirror_search(search_id, crawled_at=datetime.utcnow())
+    except Exception as e:
+        print(f" Не удалось выгрузить поиск {search_id} в колоночное хранилище: {e}")
+
+
+def prewarm_search(search_id):
+    try:
+        with app.app_context():
+            version = get_export_version(search_id)
+            key = export_key(search_id, 'xlsx', version)
+            if version[0] and not export_cache.get(key, 'xlsx'):
+                rows = (job.to_dict() for job in iter_jobs_for_search(search_id))
+                export_cache.put(key, 'xlsx', lambda f: write_excel_stream(rows, output=f))
+        print(f" Результаты поиска {search_id} подготовлены заранее")
+    except Exception as e:
+        print(f" Не удалось подготовить результаты поиска {search_id}: {e}")
+
+
+def finish_search(job, status):
+    if status == SearchQuery.STATUS_DONE and job.user_key == WATCHLIST_USER:
+        prewarm_search(job.search_id)
+    with app.app_context():
+        settle_refreshes(job.search_id)
+    # выгрузка для аналитики идёт после статуса DONE и не задерживает пользователя
+    if status == SearchQuery.STATUS_DONE:
+        mirror_search(job.search_id)
+
+
+scheduler = SearchScheduler(
+    app,
+    run_search,
+    max_workers=app.config['SEARCH_WORKERS'],
+    max_queue=app.config['SEARCH_QUEUE_SIZE'],
+    progress=progress,
+    on_finish=finish_search,
+)
+
+
+def create_enricher():
+    return VacancyEnricher(
+        create_parser(),
+        max_workers=app.config['ENRICH_WORKERS'],
+        batch_size=app.config['ENRICH_BATCH_SIZE'],
+        ttl=timedelta(days=app.config['ENRICH_TTL_DAYS']),
+    )
+
+
+enrichment = EnrichmentRunner(app, create_enricher)
 
-        print(f"{'=' * 60}\n")
 
 with app.app_context():
     try:
-        db.create_all()
+        upgrade_schema(db)
         print(" Таблицы базы данных созданы успешно")
 
         try:
@@ -178,6 +346,73 @@ with app.app_context():
         traceback.print_exc()
 
 
+def submit_search(query, city, max_pages, priority=0, full_crawl=False, user_key=None):
+    inflight_id = scheduler.find_inflight(query, city, max_pages, full_crawl)
+    if inflight_id:
+        return inflight_id, True
+
+    governor.check()
+
+    search = SearchQuery(
+        query=query,
+        city=city or 'Москва',
+        max_pages=max_pages,
+        full_crawl=full_crawl,
+        status=SearchQuery.STATUS_QUEUED,
+        priority=priority,
+        user_key=user_key or get_user_key(),
+    )
+    db.session.add(search)
+    db.session.commit()
+    print(f" Поисковый запрос сохранен с ID: {search.id}")
+
+    job = SearchJob(search.id, query, city, max_pages, user_key=search.user_key, priority=priority,
+                    full_crawl=full_crawl)
+
+    try:
+        served_id = scheduler.submit(job)
+    except SchedulerFull as e:
+        search.status = SearchQuery.STATUS_ERROR
+        search.error = str(e)
+        db.session.commit()
+        raise
+
+    if served_id != search.id:
+        db.session.delete(search)
+        db.session.commit()
+        return served_id, True
+
+    return search.id, False
+
+
+def submit_watchlist(watchlist):
+    search_id, _ = submit_search(watchlist.query, watchlist.city, watchlist.max_pages,
+                                 priority=WATCHLIST_PRIORITY, user_key=WATCHLIST_USER)
+    return search_id
+
+
+watchlist_refresher = WatchlistRefresher(
+    app,
+    submit_watchlist,
+    scheduler=scheduler,
+    governor=governor,
+    tick_seconds=app.config['WATCHLIST_TICK_SECONDS'],
+    max_per_tick=app.config['WATCHLIST_MAX_PER_TICK'],
+    off_peak=parse_hours(app.config['WATCHLIST_OFF_PEAK_HOURS']),
+)
+
+
+def start_background_workers():
+    if not app.config['BACKGROUND_WORKERS']:
+        return
+    # отладочный сервер с перезапуском выполняет модуль и в наблюдающем процессе, там потоки не нужны
+    if __name__ == '__main__' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return
+    scheduler.start()
+    if app.config['WATCHLISTS_ENABLED']:
+        watchlist_refresher.start()
+
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     form = SearchForm()
@@ -185,27 +420,43 @@ def index():
     if form.validate_on_submit():
         try:
             print(f"\n Новый поисковый запрос: {form.query.data}")
-
-            search = SearchQuery(
-                query=form.query.data,
-                city=form.city.data or 'Москва',
-            )
-            db.session.add(search)
-            db.session.commit()
-            print(f" Поисковый запрос сохранен с ID: {search.id}")
-
-            thread = ParserThread(
-                form.query.data,
-                form.city.data,
-                form.max_pages.data,
-                search.id
-            )
-            thread.daemon = True
-            thread.start()
+            refresh_minutes = form.refresh_hours.data * 60
+
+            fresh = None
+            if not form.full_crawl.data and not form.force_fresh.data:
+                fresh = find_fresh_search(form.query.data, form.city.data, form.max_pages.data,
+                                          timedelta(minutes=app.config['WATCHLIST_REUSE_MAX_MINUTES']))
+            if fresh is not None:
+                if form.watch.data:
+                    add_watchlist(get_user_key(), form.query.data, form.city.data, form.max_pages.data,
+                                  refresh_minutes, fresh.id, watchlist_refresher.off_peak)
+                flash(f'Результаты этого поиска обновлены автоматически '
+                      f'{(fresh.finished_at or fresh.created_at).strftime("%d.%m.%Y %H:%M")} UTC. '
+                      f'Чтобы выполнить поиск заново, отметьте «Искать заново».', 'info')
+                return redirect(url_for('results', search_id=fresh.id))
+
+            try:
+                search_id, collapsed = submit_search(form.query.data, form.city.data, form.max_pages.data,
+                                                     full_crawl=form.full_crawl.data)
+            except SchedulerFull:
+                flash('Сервер перегружен поисковыми запросами, попробуйте через минуту.', 'warning')
+                return redirect(url_for('index'))
+            except CircuitOpen as e:
+                flash(f'{e}. Новые поиски временно не принимаются.', 'warning')
+                return redirect(url_for('index'))
+
+            if form.watch.data and not form.full_crawl.data:
+                add_watchlist(get_user_key(), form.query.data, form.city.data, form.max_pages.data,
+                              refresh_minutes, search_id, watchlist_refresher.off_peak)
+                flash('Поиск добавлен в отслеживаемые.', 'info')
+
+            if collapsed:
+                flash(f'🔍 Такой поиск уже выполняется, показываем его результаты.', 'info')
+                return redirect(url_for('results', search_id=search_id))
 
             flash(f'🔍 Поиск по запросу "{form.query.data}" начат! Результаты появятся через несколько секунд.',
                   'success')
-            return redirect(url_for('results', search_id=search.id))
+            return redirect(url_for('results', search_id=search_id))
 
         except Exception as e:
             db.session.rollback()
@@ -217,6 +468,15 @@ def index():
     return render_template('index.html', form=form)
 
 
+def salary_filters():
+    filters = {
+        'salary_min': request.args.get('salary_min', type=int),
+        'salary_max': request.args.get('salary_max', type=int),
+        'currency': (request.args.get('currency') or '').upper() or None,
+    }
+    return {name: value for name, value in filters.items() if value is not None}
+
+
 @app.route('/results/<int:search_id>')
 def results(search_id):
     print(f"\n Загрузка результатов для поиска ID: {search_id}")
@@ -225,27 +485,26 @@ def results(search_id):
         search = get_object_or_404(SearchQuery, search_id)
         print(f" Найден поиск: '{search.query}', создан: {search.created_at}")
 
-        jobs = Job.query.filter_by(search_query_id=search_id).all()
+        filters = salary_filters()
+        jobs, next_after = get_jobs_page(search_id, limit=app.config['RESULTS_PAGE_SIZE'], **filters)
         print(f" Загружено вакансий из БД: {len(jobs)}")
 
-        if not jobs and search.created_at:
-            time_diff = datetime.now() - search.created_at
-            if time_diff.seconds < 30:
-                flash(' Поиск выполняется. Пожалуйста, подождите...', 'info')
-                return render_template('loading.html', search=search)
-
-        stats = {
-            'total': len(jobs),
-            'with_salary': sum(1 for j in jobs if j.salary and j.salary != 'Не указана'),
-            'cities': len(set(j.city for j in jobs if j.city))
-        }
+        if not jobs and not filters and search.is_active:
+            flash(' Поиск выполняется. Пожалуйста, подождите...', 'info')
+            return render_template('loading.html', search=search)
+
+        stats = get_search_stats(search_id)
         print(f" Статистика: {stats}")
 
+        city_breakdown = get_city_breakdown(search_id) if stats['cities'] > 1 else []
+
         return render_template('results.html',
                                search=search,
                                jobs=jobs,
+                               next_after=next_after,
                                stats=stats,
-                               format_salary=format_salary)
+                               city_breakdown=city_breakdown,
+                               filters=filters)
 
     except Exception as e:
         error_msg = f'Ошибка при загрузке результатов: {str(e)}'
@@ -255,6 +514,195 @@ def results(search_id):
         return redirect(url_for('index'))
 
 
+@app.route('/results/<int:search_id>/enrich', methods=['POST'])
+def enrich_results(search_id):
+    get_object_or_404(SearchQuery, search_id)
+    _, started = enrichment.submit(search_id)
+    if started:
+        flash('Загрузка полных описаний вакансий запущена в фоне.', 'info')
+    else:
+        flash('Полные описания для этого поиска уже загружаются.', 'info')
+    return redirect(url_for('results', search_id=search_id))
+
+
+@app.route('/results/<int:search_id>/events')
+def results_events(search_id):
+    search = get_object_or_404(SearchQuery, search_id)
+    initial = progress.get(search_id) or {
+        'status': search.status,
+        'pages': 0,
+        'vacancies': 0,
+        'saved': 0,
+        'results_count': search.results_count or 0,
+        'error': search.error,
+        'version': 0,
+    }
+
+    def event(state):
+        payload = {key: state.get(key) for key in ('status', 'pages', 'vacancies', 'saved', 'results_count', 'error')}
+        name = state['status'] if state['status'] in (SearchQuery.STATUS_DONE, SearchQuery.STATUS_ERROR) \
+            else 'progress'
+        return f"event: {name}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    def generate():
+        state = initial
+        yield "retry: 5000\n\n"
+        yield event(state)
+
+        while state['status'] not in (SearchQuery.STATUS_DONE, SearchQuery.STATUS_ERROR):
+            update = progress.wait(search_id, state.get('version', 0), timeout=15)
+            if update is None:
+                if progress.get(search_id) is None:
+                    break
+                yield ": keep-alive\n\n"
+                continue
+            state = update
+            yield event(state)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/hh/status')
+def api_hh_status():
+    stats = {'governor': governor.stats(), 'scheduler': scheduler.stats(),
+             'watchlists': watchlist_refresher.stats()}
+    if page_cache is not None:
+        stats['cache'] = {'hits': page_cache.hits, 'misses': page_cache.misses, 'entries': len(page_cache)}
+    return jsonify(stats)
+
+
+def analytics_request():
+    def parse_date(name):
+        value = request.args.get(name)
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            abort(400)
+
+    frame = analytics_store.load(parse_date('date_from'), parse_date('date_to'))
+    return frame, {
+        'query': request.args.get('query') or None,
+        'city': request.args.get('city') or None,
+    }
+
+
+@app.errorhandler(AnalyticsUnavailable)
+def analytics_unavailable(error):
+    return jsonify({'error': f'Analytics store is unavailable: {error}'}), 503
+
+
+@app.route('/api/analytics/salaries')
+def api_analytics_salaries():
+    frame, params = analytics_request()
+    by = [name for name in (request.args.get('by') or 'city,experience').split(',')
+          if name in ('city', 'experience', 'query', 'employment_type')]
+    currency = request.args.get('currency', 'RUR').upper()
+    return jsonify({
+        'by': by or ['city'],
+        'currency': currency,
+        'groups': salary_percentiles(frame, by=by or ['city'], currency=currency,
+                                     min_count=request.args.get('min_count', 1, type=int), **params),
+    })
+
+
+@app.route('/api/analytics/volume')
+def api_analytics_volume():
+    frame, params = analytics_request()
+    freq = request.args.get('freq', 'day')
+    if freq not in ('day', 'week', 'month'):
+        return jsonify({'error': 'freq must be day, week or month'}), 400
+    return jsonify({'freq': freq, 'periods': posting_volume(frame, freq, **params)})
+
+
+@app.route('/api/analytics/employers')
+def api_analytics_employers():
+    frame, params = analytics_request()
+    limit = min(request.args.get('limit', 10, type=int), 100)
+    return jsonify({'employers': top_employers(frame, limit=max(limit, 1), **params)})
+
+
+@app.route('/api/analytics/status')
+def api_analytics_status():
+    return jsonify(analytics_store.stats())
+
+
+@app.errorhandler(AreasUnavailable)
+def areas_unavailable(error):
+    return jsonify({'error': f'Areas directory is unavailable: {error}'}), 503
+
+
+@app.route('/api/areas')
+def api_areas():
+    text = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 10, type=int) or 10, 50)
+    return jsonify({'items': get_area_index().suggest(text, limit=limit) if text else []})
+
+
+@app.route('/api/results/<int:search_id>')
+def api_results(search_id):
+    search = db.session.get(SearchQuery, search_id)
+    if search is None:
+        return jsonify({'error': 'Search not found'}), 404
+
+    after = request.args.get('after', type=int)
+    limit = min(request.args.get('limit', app.config['RESULTS_PAGE_SIZE'], type=int), 500)
+
+    jobs, next_after = get_jobs_page(search_id, after_id=after, limit=max(limit, 1), **salary_filters())
+
+    return jsonify({
+        'search_id': search_id,
+        'status': search.status,
+        'jobs': [job.to_api_dict() for job in jobs],
+        'next_after': next_after,
+    })
+
+
+def local_search_params():
+    return {
+        'query': (request.args.get('q') or '').strip(),
+        'city': (request.args.get('city') or '').strip() or None,
+        'page': max(request.args.get('page', 1, type=int), 1),
+    }
+
+
+@app.route('/search')
+def local_search():
+    params = local_search_params()
+    filters = salary_filters()
+    per_page = app.config['RESULTS_PAGE_SIZE']
+
+    results, total = [], 0
+    if params['query']:
+        results, total = search_jobs(params['query'], params['city'], params['page'], per_page, **filters)
+        print(f" Локальный поиск '{params['query']}': найдено {total}")
+
+    pages = max((total + per_page - 1) // per_page, 1)
+    return render_template('search.html', results=results, total=total, pages=pages,
+                           per_page=per_page, filters=filters, **params)
+
+
+@app.route('/api/jobs/search')
+def api_local_search():
+    params = local_search_params()
+    if not params['query']:
+        return jsonify({'error': 'Query is required'}), 400
+
+    limit = min(request.args.get('limit', app.config['RESULTS_PAGE_SIZE'], type=int), 500)
+    results, total = search_jobs(params['query'], params['city'], params['page'], max(limit, 1),
+                                 **salary_filters())
+
+    return jsonify({
+        'query': params['query'],
+        'total': total,
+        'page': params['page'],
+        'jobs': [dict(job.to_api_dict(), snippet=str(snippet) if snippet else None)
+                 for job, snippet in results],
+    })
+
+
 @app.route('/download/<int:search_id>')
 def download(search_id):
     try:
@@ -263,33 +711,55 @@ def download(search_id):
 
         search = get_object_or_404(SearchQuery, search_id)
 
-        jobs = Job.query.filter_by(search_query_id=search_id).all()
-        print(f" Найдено {len(jobs)} вакансий для скачивания")
+        version = get_export_version(search_id)
+        print(f" Найдено {version[0]} вакансий для скачивания")
 
-        if not jobs:
+        if not version[0]:
             flash('Нет данных для скачивания', 'warning')
             return redirect(url_for('results', search_id=search_id))
 
-        vacancies = [job.to_dict() for job in jobs]
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-
         if format_type == 'excel':
-            filepath = save_to_excel(vacancies)
-            filename = f'vacancies_{search.query}_{timestamp}.xlsx'
+            ext = 'xlsx'
             mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         else:
-            filepath = save_to_csv(vacancies)
-            filename = f'vacancies_{search.query}_{timestamp}.csv'
+            ext = 'csv'
             mimetype = 'text/csv'
 
-        if filepath and os.path.exists(filepath):
+        key = export_key(search_id, ext, version)
+        filename = f'vacancies_{search.query}_{search.id}.{ext}'
+
+        if request.if_none_match.contains(key):
+            return Response(status=304, headers={'ETag': f'"{key}"'})
+
+        filepath = export_cache.get(key, ext)
+        if filepath:
+            print(f" Выгрузка взята из кэша: {filepath}")
+            return send_file(filepath, as_attachment=True, download_name=filename,
+                             mimetype=mimetype, etag=key, conditional=True)
+
+        rows = (job.to_dict() for job in iter_jobs_for_search(search_id))
+
+        if ext == 'xlsx':
+            filepath = export_cache.put(key, ext, lambda f: write_excel_stream(rows, output=f))
             print(f" Файл создан: {filepath}")
-            return send_file(filepath, as_attachment=True,
-                             download_name=filename, mimetype=mimetype)
-        else:
-            flash('Ошибка при создании файла', 'danger')
-            return redirect(url_for('results', search_id=search_id))
+            return send_file(filepath, as_attachment=True, download_name=filename,
+                             mimetype=mimetype, etag=key, conditional=True)
+
+        def generate():
+            cache_file, tmp_path = export_cache.open_temp(ext)
+            try:
+                with cache_file:
+                    for chunk in iter_csv(rows):
+                        cache_file.write(chunk.encode('utf-8'))
+                        yield chunk
+                export_cache.commit(tmp_path, key, ext)
+            finally:
+                export_cache.discard(tmp_path)
+
+        return Response(stream_with_context(generate()),
+                        mimetype=mimetype,
+                        headers={'Content-Disposition': content_disposition(filename),
+                                 'ETag': f'"{key}"'})
 
     except Exception as e:
         error_msg = f'Ошибка при скачивании: {str(e)}'
@@ -299,40 +769,176 @@ def download(search_id):
         return redirect(url_for('results', search_id=search_id))
 
 
-@app.route('/api/search', methods=['POST'])
-def api_search():
+def parse_search_request():
+    data = request.get_json(silent=True)
+
+    if not data:
+        return None, (jsonify({'error': 'No data provided'}), 400)
+
+    query = (data.get('query') or '').strip()
+    if not query:
+        return None, (jsonify({'error': 'Query is required'}), 400)
+
     try:
-        data = request.get_json()
+        max_pages = int(data.get('max_pages', 3))
+    except (TypeError, ValueError):
+        return None, (jsonify({'error': 'max_pages must be an integer'}), 400)
 
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
+    if not 1 <= max_pages <= 10:
+        return None, (jsonify({'error': 'max_pages must be between 1 and 10'}), 400)
 
-        query = data.get('query')
-        city = data.get('city')
-        max_pages = data.get('max_pages', 3)
+    city = data.get('city')
+    if isinstance(city, list):
+        city = ', '.join(str(item) for item in city)
 
-        if not query:
-            return jsonify({'error': 'Query is required'}), 400
+    cities = split_cities(city)
+    if len(cities) > app.config['MAX_SEARCH_AREAS']:
+        return None, (jsonify({'error': f"at most {app.config['MAX_SEARCH_AREAS']} cities allowed"}), 400)
 
-        print(f"\n API запрос: {query}, город: {city or 'Москва'}")
+    try:
+        unknown = find_unknown_cities(cities)
+    except AreasUnavailable as e:
+        return None, (jsonify({'error': f'Areas directory is unavailable: {e}'}), 503)
+    if unknown:
+        return None, (jsonify({
+            'error': 'Unknown city',
+            'unknown': [{'city': name, 'suggestions': suggestions} for name, suggestions in unknown],
+        }), 400)
 
-        parser = HHParser()
-        vacancies = parser.search_vacancies(query, city, max_pages)
+    return (query, city, max_pages, bool(data.get('full', False))), None
 
-        print(f" API найдено вакансий: {len(vacancies)}")
 
-        return jsonify({
-            'success': True,
-            'count': len(vacancies),
-            'vacancies': vacancies
-        })
+def search_status(search):
+    state = progress.get(search.id) or {}
+    return {
+        'id': search.id,
+        'query': search.query,
+        'city': search.city,
+        'status': search.status,
+        'results_count': search.results_count or 0,
+        'pages': state.get('pages', 0),
+        'vacancies': state.get('vacancies', 0),
+        'error': search.error,
+        'created_at': search.created_at.isoformat() if search.created_at else None,
+        'finished_at': search.finished_at.isoformat() if search.finished_at else None,
+        'status_url': url_for('api_search_status', search_id=search.id),
+        'results_url': url_for('api_search_results', search_id=search.id),
+        'stream_url': url_for('api_search_stream', search_id=search.id),
+    }
+
+
+@app.route('/api/search', methods=['POST'])
+def api_search():
+    try:
+        params, error = parse_search_request()
+        if error:
+            return error
+
+        query, city, max_pages, full_crawl = params
+        print(f"\n API запрос: {query}, город: {city or 'Москва'}")
+
+        try:
+            search_id, collapsed = submit_search(query, city, max_pages, full_crawl=full_crawl)
+        except SchedulerFull as e:
+            return jsonify({'error': str(e)}), 503
+        except CircuitOpen as e:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': str(int(e.retry_in) + 1)}
+
+        search = db.session.get(SearchQuery, search_id)
+        response = jsonify(dict(search_status(search), collapsed=collapsed))
+        response.status_code = 202
+        response.headers['Location'] = url_for('api_search_status', search_id=search_id)
+        return response
 
     except Exception as e:
+        db.session.rollback()
         print(f" Ошибка API: {e}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/search/<int:search_id>')
+def api_search_status(search_id):
+    search = db.session.get(SearchQuery, search_id)
+    if search is None:
+        return jsonify({'error': 'Search not found'}), 404
+    return jsonify(search_status(search))
+
+
+@app.route('/api/search/<int:search_id>/enrich', methods=['GET', 'POST'])
+def api_search_enrich(search_id):
+    if db.session.get(SearchQuery, search_id) is None:
+        return jsonify({'error': 'Search not found'}), 404
+
+    if request.method == 'GET':
+        state = enrichment.status(search_id)
+        if state is None:
+            return jsonify({'error': 'Enrichment not started'}), 404
+        return jsonify(state)
+
+    state, started = enrichment.submit(search_id)
+    response = jsonify(dict(state, started=started))
+    response.status_code = 202
+    response.headers['Location'] = url_for('api_search_enrich', search_id=search_id)
+    return response
+
+
+@app.route('/api/search/<int:search_id>/results')
+def api_search_results(search_id):
+    return api_results(search_id)
+
+
+def stream_search_jobs(search_id, batch_size=100):
+    last_seq = 0
+    version = 0
+
+    while True:
+        db.session.close()
+        search = db.session.get(SearchQuery, search_id)
+        finished = search is None or not search.is_active
+
+        while True:
+            jobs, last_seq = get_linked_jobs(search_id, after_seq=last_seq, limit=batch_size)
+            for job in jobs:
+                yield json.dumps(job.to_api_dict(), ensure_ascii=False) + '\n'
+            if len(jobs) < batch_size:
+                break
+
+        if finished:
+            status = search.status if search else SearchQuery.STATUS_ERROR
+            yield json.dumps({'event': 'end', 'status': status,
+                              'error': search.error if search else 'Search not found'},
+                             ensure_ascii=False) + '\n'
+            return
+
+        state = progress.wait(search_id, version, timeout=5)
+        if state is not None:
+            version = state['version']
+
+
+@app.route('/api/search/stream', methods=['POST'])
+@app.route('/api/search/<int:search_id>/stream')
+def api_search_stream(search_id=None):
+    if search_id is None:
+        params, error = parse_search_request()
+        if error:
+            return error
+
+        try:
+            query, city, max_pages, full_crawl = params
+            search_id, _ = submit_search(query, city, max_pages, full_crawl=full_crawl)
+        except SchedulerFull as e:
+            return jsonify({'error': str(e)}), 503
+        except CircuitOpen as e:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': str(int(e.retry_in) + 1)}
+    elif db.session.get(SearchQuery, search_id) is None:
+        return jsonify({'error': 'Search not found'}), 404
+
+    return Response(stream_with_context(stream_search_jobs(search_id)),
+                    mimetype='application/x-ndjson',
+                    headers={'X-Search-Id': str(search_id), 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/history')
 def history():
     try:
@@ -354,6 +960,41 @@ def history():
         traceback.print_exc()
         return redirect(url_for('index'))
 
+@app.route('/watchlists')
+def watchlists():
+    items = db.session.execute(
+        db.select(Watchlist)
+        .where(Watchlist.user_key == get_user_key(), Watchlist.active.is_(True))
+        .order_by(Watchlist.created_at.desc())
+    ).scalars().all()
+    return render_template('watchlists.html', watchlists=items)
+
+
+def get_user_watchlist(watchlist_id):
+    watchlist = db.session.get(Watchlist, watchlist_id)
+    if watchlist is None or watchlist.user_key != get_user_key():
+        abort(404)
+    return watchlist
+
+
+@app.route('/watchlists/<int:watchlist_id>/refresh', methods=['POST'])
+def refresh_watchlist(watchlist_id):
+    watchlist = get_user_watchlist(watchlist_id)
+    watchlist.next_refresh_at = datetime.utcnow()
+    db.session.commit()
+    flash(f'Поиск «{watchlist.query}» будет обновлён в ближайшие минуты.', 'info')
+    return redirect(url_for('watchlists'))
+
+
+@app.route('/watchlists/<int:watchlist_id>/delete', methods=['POST'])
+def delete_watchlist(watchlist_id):
+    watchlist = get_user_watchlist(watchlist_id)
+    watchlist.active = False
+    db.session.commit()
+    flash(f'Поиск «{watchlist.query}» больше не отслеживается.', 'info')
+    return redirect(url_for('watchlists'))
+
+
 @app.route('/about')
 def about():
     return render_template('about.html')
@@ -381,6 +1022,9 @@ def utility_processor():
     }
 
 
+start_background_workers()
+
+
 if __name__ == '__main__':
     print("\n" + "=" * 60)
     print(" ЗАПУСК ПРИЛОЖЕНИЯ")
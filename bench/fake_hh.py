@@ -0,0 +1,263 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+CITIES = [('1', 'Москва'), ('2', 'Санкт-Петербург'), ('3', 'Екатеринбург'), ('4', 'Новосибирск'), ('88', 'Казань')]
+# регионы верхнего уровня для городов, которые не являются субъектами РФ сами по себе
+REGIONS = {'3': ('1261', 'Свердловская область'), '4': ('1202', 'Новосибирская область'),
+           '88': ('1624', 'Республика Татарстан')}
+TITLES = ['Python разработчик', 'Java программист', 'Data Scientist', 'Frontend разработчик',
+          'Системный администратор', 'Project Manager', 'QA инженер', 'DevOps инженер']
+EXPERIENCE = ['Нет опыта', 'От 1 года до 3 лет', 'От 3 до 6 лет', 'Более 6 лет']
+SNIPPET = 'Опыт коммерческой разработки. Знание <highlighttext>SQL</highlighttext>, Git, Docker.'
+
+VACANCY_PATH_RE = re.compile(r'^/vacancies/(\d+)$')
+
+
+def synthetic_vacancy(n, now=None):
+    rnd = random.Random(n)
+    area_id, area_name = CITIES[n % len(CITIES)]
+    salary = None
+    if n % 3:
+        low = rnd.randrange(60, 400) * 1000
+        salary = {'from': low, 'to': low + rnd.randrange(0, 150) * 1000 if n % 2 else None,
+                  'currency': 'RUR', 'gross': bool(n % 4)}
+    published = (now or datetime(2026, 1, 31)) - timedelta(minutes=n * 7)
+    return {
+        'id': str(100000 + n),
+        'name': f'{TITLES[n % len(TITLES)]} #{n}',
+        'area': {'id': area_id, 'name': area_name},
+        'salary': salary,
+        'employer': {'id': str(n % 500), 'name': f'Компания {n % 500}'},
+        'experience': {'id': str(n % 4), 'name': EXPERIENCE[n % 4]},
+        'snippet': {'requirement': SNIPPET, 'responsibility': 'Разработка и поддержка сервисов.'},
+        'published_at': published.strftime('%Y-%m-%dT%H:%M:%S+0300'),
+        'alternate_url': f'https://hh.ru/vacancy/{100000 + n}',
+    }
+
+
+def vacancy_details(item):
+    return dict(
+        item,
+        description='<p>' + '</p><p>'.join([item['snippet']['requirement']] * 20) + '</p>',
+        key_skills=[{'name': name} for name in ('Python', 'SQL', 'Docker', 'Git')],
+        employment={'id': 'full', 'name': 'Полная занятость'},
+    )
+
+
+def areas_tree():
+    def node(area_id, name, parent_id, areas=()):
+        return {'id': area_id, 'parent_id': parent_id, 'name': name, 'areas': list(areas)}
+
+    russia = node('113', 'Россия', None)
+    for area_id, name in CITIES:
+        region = REGIONS.get(area_id)
+        if region is None:
+            russia['areas'].append(node(area_id, name, '113'))
+        else:
+            russia['areas'].append(node(region[0], region[1], '113', [node(area_id, name, region[0])]))
+    return [russia]
+
+
+def search_page_html(items):
+    cards = []
+    for item in items:
+        salary = item.get('salary') or {}
+        cards.append(
+            '<div class="vacancy-serp-item" data-qa="vacancy-serp__vacancy">'
+            f'<a data-qa="vacancy-serp__vacancy-title" href="{item["alternate_url"]}">{escape(item["name"])}</a>'
+            f'<a data-qa="vacancy-serp__vacancy-employer">{escape(item["employer"]["name"])}</a>'
+            f'<span data-qa="vacancy-serp__vacancy-compensation">{salary.get("from") or ""} ₽</span>'
+            f'<span data-qa="vacancy-serp__vacancy-address">{escape(item["area"]["name"])}</span>'
+            f'<div data-qa="vacancy-serp__vacancy-work-experience">{escape(item["experience"]["name"])}</div>'
+            f'<div data-qa="vacancy-serp__vacancy_snippet_requirement">{item["snippet"]["requirement"]}</div>'
+            '</div>'
+        )
+    return f'<html><body><main>{"".join(cards)}</main></body></html>'
+
+
+def load_fixtures(path):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    pages = data if isinstance(data, list) else [data]
+    items = []
+    for page in pages:
+        items.extend(page.get('items', []) if isinstance(page, dict) else [page])
+    return items
+
+
+class FakeHHServer:
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0, found=2000,
+                 fixtures=None, seed=0, failing_areas=()):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.failing_areas = {str(area) for area in failing_areas}
+        self.found = found
+        self.items = load_fixtures(fixtures) if fixtures else None
+        self.random = random.Random(seed)
+        self.counters = {'requests': 0, 'errors': 0, 'not_modified': 0}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def api_url(self):
+        return f'{self.url}/vacancies'
+
+    @property
+    def areas_url(self):
+        return f'{self.url}/areas'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='fake-hh', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def item(self, n):
+        if self.items:
+            return self.items[n % len(self.items)]
+        return synthetic_vacancy(n)
+
+    def page(self, page, per_page):
+        total = len(self.items) if self.items else self.found
+        depth = min(total, 2000)
+        start = page * per_page
+        return {
+            'items': [self.item(n) for n in range(start, min(start + per_page, depth))],
+            'found': total,
+            'pages': (depth + per_page - 1) // per_page,
+            'page': page,
+            'per_page': per_page,
+        }
+
+    def _should_fail(self):
+        with self._lock:
+            self.counters['requests'] += 1
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.counters['errors'] += 1
+                return True
+        return False
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body=b'', content_type='application/json; charset=utf-8', headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                if body:
+                    self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_json(self, data):
+                body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    with server._lock:
+                        server.counters['not_modified'] += 1
+                    self._send(304, headers={'ETag': etag})
+                    return
+                self._send(200, body, headers={'ETag': etag})
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                if server._should_fail():
+                    self._send(503, b'{"errors": [{"type": "service_unavailable"}]}', headers={'Retry-After': '0'})
+                    return
+
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+
+                if url.path == '/vacancies':
+                    if query.get('area', [''])[0] in server.failing_areas:
+                        with server._lock:
+                            server.counters['errors'] += 1
+                        self._send(503, b'{"errors": [{"type": "service_unavailable"}]}')
+                        return
+                    page = int(query.get('page', ['0'])[0])
+                    per_page = int(query.get('per_page', ['20'])[0])
+                    self._send_json(server.page(page, per_page))
+                    return
+
+                if url.path == '/areas':
+                    self._send_json(areas_tree())
+                    return
+
+                match = VACANCY_PATH_RE.match(url.path)
+                if match:
+                    n = int(match.group(1)) - 100000
+                    if n < 0:
+                        self._send(404, b'{"errors": [{"type": "not_found"}]}')
+                        return
+                    self._send_json(vacancy_details(server.item(n)))
+                    return
+
+                if url.path == '/search/vacancy':
+                    page = server.page(int(query.get('page', ['0'])[0]), 20)
+                    self._send(200, search_page_html(page['items']).encode('utf-8'), 'text/html; charset=utf-8')
+                    return
+
+                self._send(404, b'{"errors": [{"type": "not_found"}]}')
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальная замена api.hh.ru для бенчмарков')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help='задержка ответа, с')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ответов 503')
+    parser.add_argument('--found', type=int, default=2000, help='число синтетических вакансий')
+    parser.add_argument('--fixtures', help='JSON с записанными ответами /vacancies')
+    parser.add_argument('--failing-area', action='append', default=[],
+                        help='ID региона, по которому /vacancies всегда отвечает 503')
+    args = parser.parse_args()
+
+    server = FakeHHServer(args.host, args.port, args.latency, args.error_rate, args.found, args.fixtures,
+                          failing_areas=args.failing_area)
+    print(f" Тестовый сервер hh.ru: {server.api_url}")
+    print(f" Для запуска приложения: HH_API_URL={server.api_url} HH_AREAS_URL={server.areas_url} python app.py")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
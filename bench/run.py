@@ -0,0 +1,336 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, 'bench', 'baseline.json')
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from bench.fake_hh import FakeHHServer, synthetic_vacancy, search_page_html
+
+BENCHMARKS = []
+
+
+class Skip(Exception):
+    pass
+
+
+def benchmark(name, repeat=5):
+    def register(func):
+        BENCHMARKS.append((name, func, repeat))
+        return func
+    return register
+
+
+class Context:
+
+    def __init__(self, latency):
+        self.workdir = tempfile.mkdtemp(prefix='job-parser-bench-')
+        self.server = FakeHHServer(latency=latency, found=2000).start()
+        self._app = None
+        self._search_id = None
+        self.cleanups = []
+
+    @property
+    def app(self):
+        if self._app is None:
+            os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(self.workdir, 'bench.db')}"
+            os.environ['HH_API_URL'] = self.server.api_url
+            os.environ['HH_AREAS_URL'] = self.server.areas_url
+            os.environ['HH_AREAS_PATH'] = os.path.join(self.workdir, 'areas.json')
+            os.environ['HH_CACHE_BACKEND'] = 'none'
+            os.environ['BACKGROUND_WORKERS'] = '0'
+
+            from app import app
+            app.testing = True
+            app.config['DOWNLOAD_FOLDER'] = os.path.join(self.workdir, 'downloads')
+            os.makedirs(app.config['DOWNLOAD_FOLDER'], exist_ok=True)
+            self._app = app
+        return self._app
+
+    def vacancies(self, count, prefix=''):
+        from parser.hh_api_parser import HHAPIParser
+        parser = HHAPIParser()
+        vacancies = [parser._parse_api_vacancy(synthetic_vacancy(n)) for n in range(count)]
+        if prefix:
+            for vac in vacancies:
+                vac['url'] = f"{vac['url']}?{prefix}"
+        return vacancies
+
+    def seeded_search(self, count=2000):
+        if self._search_id is None:
+            from parser.models import db, SearchQuery
+            from parser.persistence import save_vacancies
+
+            with self.app.app_context():
+                search = SearchQuery(query='bench', city='Москва', results_count=count,
+                                     status=SearchQuery.STATUS_DONE)
+                db.session.add(search)
+                db.session.commit()
+                save_vacancies(search.id, self.vacancies(count, prefix='seed'))
+                db.session.commit()
+                self._search_id = search.id
+        return self._search_id
+
+    def close(self):
+        for cleanup in self.cleanups:
+            cleanup()
+        self.server.stop()
+
+
+def fast_governor():
+    from parser.governor import RequestGovernor
+    return RequestGovernor(rate=10000, max_rate=10000)
+
+
+@benchmark('api_search_sequential', repeat=3)
+def bench_api_search_sequential(ctx):
+    from parser.hh_api_parser import HHAPIParser
+    parser = HHAPIParser(concurrent=False, governor=fast_governor(), api_url=ctx.server.api_url)
+    return lambda: parser.search_vacancies('python', None, max_pages=10)
+
+
+@benchmark('api_search_concurrent', repeat=3)
+def bench_api_search_concurrent(ctx):
+    from parser.hh_api_parser import HHAPIParser
+    parser = HHAPIParser(concurrent=True, max_workers=4, governor=fast_governor(), api_url=ctx.server.api_url)
+    return lambda: parser.search_vacancies('python', None, max_pages=10)
+
+
+@benchmark('api_search_async', repeat=3)
+def bench_api_search_async(ctx):
+    try:
+        from parser.hh_async_client import HHAsyncClient
+    except ImportError as e:
+        raise Skip(str(e))
+    client = HHAsyncClient(max_workers=4, governor=fast_governor(), api_url=ctx.server.api_url)
+    ctx.cleanups.append(client.close)
+    return lambda: client.search_vacancies('python', None, max_pages=10)
+
+
+@benchmark('parse_api_vacancy_x5000')
+def bench_parse_api_vacancy(ctx):
+    from parser.hh_api_parser import HHAPIParser
+    parser = HHAPIParser()
+    items = [synthetic_vacancy(n) for n in range(5000)]
+    return lambda: [parser._parse_api_vacancy(item) for item in items]
+
+
+@benchmark('parse_search_page_html')
+def bench_parse_search_page(ctx):
+    try:
+        from parser.hh_parser import HHParser
+        parser = HHParser()
+    except ImportError as e:
+        raise Skip(str(e))
+    html = search_page_html([synthetic_vacancy(n) for n in range(20)])
+    return lambda: parser._parse_search_page(html)
+
+
+@benchmark('save_vacancies_x2000', repeat=3)
+def bench_save_vacancies(ctx):
+    from parser.models import db, SearchQuery
+    from parser.persistence import save_vacancies
+
+    app = ctx.app
+    runs = iter(range(1000))
+
+    def run():
+        run_id = next(runs)
+        vacancies = ctx.vacancies(2000, prefix=f'save{run_id}')
+        with app.app_context():
+            search = SearchQuery(query=f'bench save {run_id}', city='Москва')
+            db.session.add(search)
+            db.session.commit()
+            save_vacancies(search.id, vacancies)
+            db.session.commit()
+    return run
+
+
+def export_rows(ctx):
+    from parser.queries import iter_jobs_for_search
+    search_id = ctx.seeded_search()
+    with ctx.app.app_context():
+        return [job.to_dict() for job in iter_jobs_for_search(search_id)]
+
+
+@benchmark('save_to_csv_x2000', repeat=3)
+def bench_save_to_csv(ctx):
+    from parser.utils import save_to_csv
+    rows = export_rows(ctx)
+
+    def run():
+        with ctx.app.app_context():
+            os.remove(save_to_csv(rows, 'bench.csv'))
+    return run
+
+
+@benchmark('save_to_excel_x2000', repeat=3)
+def bench_save_to_excel(ctx):
+    from parser.utils import save_to_excel
+    rows = export_rows(ctx)
+
+    def run():
+        with ctx.app.app_context():
+            os.remove(save_to_excel(rows, 'bench.xlsx'))
+    return run
+
+
+@benchmark('export_stream_csv_x2000', repeat=3)
+def bench_export_stream_csv(ctx):
+    from parser.utils import iter_csv
+    rows = export_rows(ctx)
+    return lambda: sum(len(chunk) for chunk in iter_csv(rows))
+
+
+@benchmark('export_stream_xlsx_x2000', repeat=3)
+def bench_export_stream_xlsx(ctx):
+    from parser.utils import write_excel_stream
+    rows = export_rows(ctx)
+    return lambda: write_excel_stream(rows).close()
+
+
+@benchmark('results_render', repeat=5)
+def bench_results_render(ctx):
+    search_id = ctx.seeded_search()
+    client = ctx.app.test_client()
+
+    def run():
+        response = client.get(f'/results/{search_id}')
+        assert response.status_code == 200, response.status_code
+    return run
+
+
+@benchmark('local_search_x2000', repeat=5)
+def bench_local_search(ctx):
+    from parser.fulltext import search_jobs
+    ctx.seeded_search()
+
+    def run():
+        with ctx.app.app_context():
+            results, total = search_jobs('разработчик python', page=2)
+            assert total, total
+    return run
+
+
+def measure(func, repeat):
+    func()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return {
+        'median': statistics.median(timings),
+        'min': min(timings),
+        'max': max(timings),
+        'repeat': repeat,
+    }
+
+
+def run_benchmarks(only=None, repeat=None, latency=0.02):
+    ctx = Context(latency)
+    results = {}
+    try:
+        for name, setup, default_repeat in BENCHMARKS:
+            if only and not any(part in name for part in only):
+                continue
+            try:
+                func = setup(ctx)
+            except Skip as e:
+                results[name] = {'skipped': str(e)}
+                print(f" {name:<28} пропущен: {e}")
+                continue
+            results[name] = measure(func, repeat or default_repeat)
+            print(f" {name:<28} {results[name]['min'] * 1000:10.2f} мс (медиана {results[name]['median'] * 1000:.2f})")
+    finally:
+        ctx.close()
+    return results
+
+
+def compare(results, baseline, threshold):
+    rows = []
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if 'skipped' in result or not base or 'skipped' in base:
+            rows.append((name, result.get('min'), base.get('min') if base else None, None, 'нет базы'))
+            continue
+        ratio = result['min'] / base['min'] if base['min'] else 1.0
+        if ratio > 1 + threshold:
+            status = 'РЕГРЕССИЯ'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            status = 'быстрее'
+        else:
+            status = 'OK'
+        rows.append((name, result['min'], base['min'], ratio, status))
+    return rows, regressions
+
+
+def print_report(rows):
+    print(f"\n {'Бенчмарк':<28} {'Сейчас, мс':>12} {'База, мс':>12} {'Отношение':>10}  Статус")
+    for name, current, base, ratio, status in rows:
+        current = f'{current * 1000:.2f}' if current is not None else '-'
+        base = f'{base * 1000:.2f}' if base is not None else '-'
+        ratio = f'{ratio:.2f}x' if ratio is not None else '-'
+        print(f" {name:<28} {current:>12} {base:>12} {ratio:>10}  {status}")
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f).get('results', {})
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'created_at': datetime.now().isoformat(timespec='seconds'),
+                   'python': sys.version.split()[0],
+                   'results': results}, f, ensure_ascii=False, indent=2)
+    print(f"\n Базовые результаты сохранены: {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарки парсера вакансий на локальном сервере hh.ru')
+    parser.add_argument('--only', nargs='*', help='запустить только бенчмарки, содержащие эти подстроки')
+    parser.add_argument('--repeat', type=int, help='число повторов каждого бенчмарка')
+    parser.add_argument('--latency', type=float, default=0.02, help='задержка тестового сервера, с')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='файл с базовыми результатами')
+    parser.add_argument('--save-baseline', action='store_true', help='сохранить результаты как базовые')
+    parser.add_argument('--threshold', type=float, default=0.2, help='допустимое замедление, доля')
+    parser.add_argument('--json', help='сохранить результаты в JSON')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.only, args.repeat, args.latency)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"\n Базовые результаты не найдены ({args.baseline}), запустите с --save-baseline")
+        return 0
+
+    rows, regressions = compare(results, baseline, args.threshold)
+    print_report(rows)
+    print(f"\n Регрессий: {len(regressions)}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
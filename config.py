@@ -7,10 +7,58 @@ load_dotenv()
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'hard-to-guess-string'
+    # число обратных прокси перед приложением, которым можно доверять X-Forwarded-For
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
 
     db_path = os.path.join(basedir, 'data', 'jobs.db')
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or f'sqlite:///{db_path}'
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     DOWNLOAD_FOLDER = os.path.join(basedir, 'downloads')
-    MAX_SEARCH_RESULTS = 100
\ No newline at end of file
+    EXPORT_CACHE_MAX_BYTES = int(os.environ.get('EXPORT_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+    MAX_SEARCH_RESULTS = 100
+    RESULTS_PAGE_SIZE = 50
+    MAX_SEARCH_AREAS = int(os.environ.get('MAX_SEARCH_AREAS', 20))
+
+    HH_CONCURRENT_FETCH = os.environ.get('HH_CONCURRENT_FETCH', '1') == '1'
+    HH_MAX_WORKERS = int(os.environ.get('HH_MAX_WORKERS', 4))
+    HH_RATE_LIMIT = float(os.environ.get('HH_RATE_LIMIT', 5))
+    HH_ASYNC_CLIENT = os.environ.get('HH_ASYNC_CLIENT', '1') == '1'
+    HH_API_URL = os.environ.get('HH_API_URL', 'https://api.hh.ru/vacancies')
+    HH_MAX_CONNECTIONS = int(os.environ.get('HH_MAX_CONNECTIONS', 20))
+    HH_MIN_RATE = float(os.environ.get('HH_MIN_RATE', 0.5))
+    HH_MAX_RATE = float(os.environ.get('HH_MAX_RATE', 10))
+    HH_MAX_RETRIES = int(os.environ.get('HH_MAX_RETRIES', 3))
+    HH_BREAKER_THRESHOLD = int(os.environ.get('HH_BREAKER_THRESHOLD', 5))
+    HH_BREAKER_TIMEOUT = float(os.environ.get('HH_BREAKER_TIMEOUT', 30))
+
+    HH_CACHE_BACKEND = os.environ.get('HH_CACHE_BACKEND', 'memory')
+    HH_CACHE_TTL = int(os.environ.get('HH_CACHE_TTL', 300))
+    HH_CACHE_MAX_ENTRIES = int(os.environ.get('HH_CACHE_MAX_ENTRIES', 1000))
+    HH_CACHE_PATH = os.path.join(basedir, 'data', 'hh_cache.db')
+
+    HH_AREAS_PATH = os.environ.get('HH_AREAS_PATH') or os.path.join(basedir, 'parser', 'data', 'areas.json')
+    HH_AREAS_URL = os.environ.get('HH_AREAS_URL', 'https://api.hh.ru/areas')
+
+    INCREMENTAL_SEARCH = os.environ.get('INCREMENTAL_SEARCH', '1') == '1'
+
+    SEARCH_WORKERS = int(os.environ.get('SEARCH_WORKERS', 2))
+    # планировщик и обновление списков отслеживания запускаются при импорте приложения;
+    # консольные утилиты, импортирующие app, выключают их
+    BACKGROUND_WORKERS = os.environ.get('BACKGROUND_WORKERS', '1') == '1'
+    SEARCH_QUEUE_SIZE = int(os.environ.get('SEARCH_QUEUE_SIZE', 100))
+
+    ENRICH_WORKERS = int(os.environ.get('ENRICH_WORKERS', 4))
+    ENRICH_BATCH_SIZE = int(os.environ.get('ENRICH_BATCH_SIZE', 50))
+    ENRICH_TTL_DAYS = int(os.environ.get('ENRICH_TTL_DAYS', 7))
+
+    ANALYTICS_PATH = os.environ.get('ANALYTICS_PATH') or os.path.join(basedir, 'data', 'analytics')
+    ANALYTICS_MIRROR = os.environ.get('ANALYTICS_MIRROR', '1') == '1'
+
+    WATCHLISTS_ENABLED = os.environ.get('WATCHLISTS_ENABLED', '1') == '1'
+    WATCHLIST_TICK_SECONDS = int(os.environ.get('WATCHLIST_TICK_SECONDS', 60))
+    WATCHLIST_MAX_PER_TICK = int(os.environ.get('WATCHLIST_MAX_PER_TICK', 5))
+    # результаты отслеживания старше этого срока не подставляются вместо нового поиска
+    WATCHLIST_REUSE_MAX_MINUTES = int(os.environ.get('WATCHLIST_REUSE_MAX_MINUTES', 60))
+    # ночное окно для ежедневных обновлений, часы по UTC (0-5 UTC = 3-8 МСК)
+    WATCHLIST_OFF_PEAK_HOURS = os.environ.get('WATCHLIST_OFF_PEAK_HOURS', '0-5')
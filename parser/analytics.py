@@ -0,0 +1,401 @@
+import argparse
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from parser.models import db, Job, SearchQuery, search_query_jobs
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = 'crawl_date='
+
+COLUMNS = [
+    'job_id', 'hh_id', 'search_id', 'query', 'title', 'company', 'city', 'experience',
+    'employment_type', 'salary_from', 'salary_to', 'salary_mid', 'currency', 'gross',
+    'published_at', 'crawled_at',
+]
+
+CATEGORY_COLUMNS = ['query', 'company', 'city', 'experience', 'employment_type', 'currency']
+
+PERCENTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+VOLUME_FREQUENCIES = {
+    'day': 'D',
+    'week': 'W-MON',
+    'month': 'MS',
+}
+
+EXPERIENCE_ORDER = ['Нет опыта', 'От 1 года до 3 лет', 'От 3 до 6 лет', 'Более 6 лет']
+
+
+class AnalyticsUnavailable(Exception):
+    pass
+
+
+def _normalize_query(query):
+    return ' '.join((query or '').lower().split())
+
+
+def search_frame(search_id, crawled_at=None):
+    search = db.session.get(SearchQuery, search_id)
+    if search is None:
+        return None
+
+    stmt = (
+        db.select(Job.id, Job.hh_id, Job.title, Job.company, Job.city, Job.experience,
+                  Job.employment_type, Job.salary_from, Job.salary_to, Job.currency, Job.gross,
+                  Job.published_at)
+        .join(search_query_jobs, search_query_jobs.c.job_id == Job.id)
+        .where(search_query_jobs.c.search_query_id == search_id)
+    )
+    result = db.session.execute(stmt)
+    frame = pd.DataFrame(result.all(), columns=list(result.keys()))
+    return prepare_frame(frame.rename(columns={'id': 'job_id'}), search_id, search.query,
+                         crawled_at or search.finished_at or search.created_at)
+
+
+def prepare_frame(frame, search_id, query, crawled_at):
+    frame = frame.copy()
+    frame['search_id'] = search_id
+    frame['query'] = _normalize_query(query)
+    frame['crawled_at'] = pd.Timestamp(crawled_at or datetime.utcnow())
+
+    for name in COLUMNS:
+        if name not in frame:
+            frame[name] = None
+
+    frame['salary_from'] = pd.to_numeric(frame['salary_from'], errors='coerce').astype('float64')
+    frame['salary_to'] = pd.to_numeric(frame['salary_to'], errors='coerce').astype('float64')
+    frame['salary_mid'] = frame[['salary_from', 'salary_to']].mean(axis=1, skipna=True)
+    frame['published_at'] = pd.to_datetime(frame['published_at'], errors='coerce', utc=True).dt.tz_localize(None)
+    frame['gross'] = frame['gross'].astype('boolean')
+    frame['job_id'] = frame['job_id'].astype('int64')
+    frame['search_id'] = frame['search_id'].astype('int64')
+    for name in CATEGORY_COLUMNS:
+        frame[name] = frame[name].astype('string').astype('category')
+    for name in ('hh_id', 'title'):
+        frame[name] = frame[name].astype('string')
+
+    return frame[COLUMNS]
+
+
+class ColumnarStore:
+
+    def __init__(self, path, cache_size=4):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _partition_dir(self, crawl_date):
+        return os.path.join(self.path, f'{PARTITION_PREFIX}{crawl_date.isoformat()}')
+
+    def partitions(self):
+        if not os.path.isdir(self.path):
+            return []
+        found = []
+        for entry in os.scandir(self.path):
+            if not entry.is_dir() or not entry.name.startswith(PARTITION_PREFIX):
+                continue
+            try:
+                found.append((date.fromisoformat(entry.name[len(PARTITION_PREFIX):]), entry.path))
+            except ValueError:
+                continue
+        return sorted(found)
+
+    def files(self, date_from=None, date_to=None):
+        files = []
+        for crawl_date, path in self.partitions():
+            if date_from and crawl_date < date_from:
+                continue
+            if date_to and crawl_date > date_to:
+                continue
+            for entry in os.scandir(path):
+                if entry.is_file() and entry.name.endswith('.parquet'):
+                    files.append((entry.path, entry.stat().st_mtime_ns))
+        return sorted(files)
+
+    def append(self, frame, crawled_at=None):
+        if frame is None or frame.empty:
+            return None
+
+        crawled_at = crawled_at or frame['crawled_at'].iloc[0].to_pydatetime()
+        directory = self._partition_dir(crawled_at.date())
+        os.makedirs(directory, exist_ok=True)
+
+        search_ids = frame['search_id'].unique()
+        name = f"search-{search_ids[0] if len(search_ids) == 1 else 'batch'}-{crawled_at:%H%M%S%f}.parquet"
+        path = os.path.join(directory, name)
+        tmp_path = f'{path}.tmp'
+
+        try:
+            frame.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except ImportError as e:
+            raise AnalyticsUnavailable(str(e))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path
+
+    def mirror_search(self, search_id, crawled_at=None):
+        frame = search_frame(search_id, crawled_at)
+        if frame is None or frame.empty:
+            return None
+        path = self.append(frame)
+        logger.info(f"Поиск {search_id} выгружен в колоночное хранилище: {len(frame)} строк")
+        return path
+
+    def load(self, date_from=None, date_to=None, columns=None):
+        files = self.files(date_from, date_to)
+        columns = list(columns) if columns else None
+        key = (date_from, date_to, tuple(columns or ()))
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                if cached[0] == files:
+                    return cached[1]
+
+        if not files:
+            frame = pd.DataFrame({name: pd.Series(dtype='object') for name in (columns or COLUMNS)})
+        elif cached is not None and set(cached[0]) <= set(files):
+            # после новых поисков дочитываем только появившиеся файлы
+            known = set(cached[0])
+            frame = self._combine([cached[1], self._read([f for f in files if f not in known], columns)])
+        else:
+            frame = self._combine([self._read(files, columns)])
+
+        with self._lock:
+            self._cache[key] = (files, frame)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return frame
+
+    def _read(self, files, columns=None):
+        try:
+            return pd.concat([pd.read_parquet(path, columns=columns) for path, _ in files], ignore_index=True)
+        except ImportError as e:
+            raise AnalyticsUnavailable(str(e))
+
+    def _combine(self, frames):
+        frame = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        for name in CATEGORY_COLUMNS:
+            if name in frame and not isinstance(frame[name].dtype, pd.CategoricalDtype):
+                frame[name] = frame[name].astype('category')
+        if 'crawled_at' in frame and not frame['crawled_at'].is_monotonic_increasing:
+            frame = frame.sort_values('crawled_at', kind='stable', ignore_index=True)
+        return frame
+
+    def compact(self, before=None, min_files=2):
+        before = before or datetime.utcnow().date()
+        compacted = 0
+        for crawl_date, directory in self.partitions():
+            if crawl_date >= before:
+                continue
+            files = [(entry.path, 0) for entry in os.scandir(directory)
+                     if entry.is_file() and entry.name.endswith('.parquet')]
+            if len(files) < min_files:
+                continue
+
+            frame = self._read(sorted(files))
+            path = os.path.join(directory, f"part-{datetime.utcnow():%Y%m%d%H%M%S%f}.parquet")
+            tmp_path = f'{path}.tmp'
+            try:
+                frame.to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            for old_path, _ in files:
+                os.remove(old_path)
+
+            compacted += 1
+            logger.info(f"Раздел {crawl_date} сжат: {len(files)} файлов -> 1, {len(frame)} строк")
+        return compacted
+
+    def stats(self):
+        files = self.files()
+        return {
+            'partitions': len(self.partitions()),
+            'files': len(files),
+            'bytes': sum(os.path.getsize(path) for path, _ in files),
+        }
+
+
+def _key_codes(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy().astype('int64') + 1
+    values = series.to_numpy()
+    if values.dtype.kind in 'iu' and (not len(values) or values.min() >= 0):
+        return values.astype('int64')
+    return pd.factorize(values)[0].astype('int64') + 1
+
+
+def latest_snapshot(frame, keys=('job_id',)):
+    if len(frame) < 2:
+        return frame
+    if not frame['crawled_at'].is_monotonic_increasing:
+        frame = frame.iloc[np.argsort(frame['crawled_at'].to_numpy(), kind='stable')]
+
+    combined = None
+    for name in keys:
+        codes = _key_codes(frame[name])
+        combined = codes if combined is None else combined * (int(codes.max()) + 1) + codes
+    return frame[~pd.Series(combined).duplicated(keep='last').to_numpy()]
+
+
+def filter_frame(frame, columns=None, query=None, city=None, currency=None):
+    if columns is not None:
+        columns = list(dict.fromkeys(['job_id', 'crawled_at', *columns]))
+    else:
+        columns = list(frame.columns)
+    if frame.empty:
+        return frame[columns]
+
+    mask = np.ones(len(frame), dtype=bool)
+    if query:
+        mask &= (frame['query'] == _normalize_query(query)).to_numpy(dtype=bool, na_value=False)
+    if city:
+        mask &= (frame['city'] == city).to_numpy(dtype=bool, na_value=False)
+    if currency:
+        mask &= (frame['currency'] == currency).to_numpy(dtype=bool, na_value=False)
+    return frame.loc[mask, columns]
+
+
+def salary_percentiles(frame, by=('city', 'experience'), currency='RUR', percentiles=PERCENTILES,
+                       min_count=1, query=None, city=None):
+    by = list(by)
+    frame = filter_frame(frame, by + ['salary_mid'], query=query, city=city, currency=currency)
+    frame = latest_snapshot(frame)
+    frame = frame[frame['salary_mid'].notna().to_numpy()]
+    if frame.empty:
+        return []
+
+    grouped = frame.groupby(by, observed=True, dropna=False)['salary_mid']
+    table = grouped.quantile(list(percentiles)).unstack()
+    table.columns = [f'p{round(p * 100)}' for p in table.columns]
+    table['mean'] = grouped.mean()
+    table['count'] = grouped.size()
+    table = table[table['count'] >= min_count]
+
+    table = table.reset_index()
+    if 'experience' in by:
+        rank = {name: i for i, name in enumerate(EXPERIENCE_ORDER)}
+        table['_experience_rank'] = table['experience'].astype('object').map(rank).fillna(len(rank))
+    sort_by = ['count'] + (['_experience_rank'] if 'experience' in by else [])
+    table = table.sort_values(sort_by, ascending=[False] + [True] * (len(sort_by) - 1))
+    table = table.drop(columns=['_experience_rank'], errors='ignore')
+    return _records(table)
+
+
+def _period_starts(values, freq):
+    if freq == 'month':
+        return values.astype('datetime64[M]').astype('datetime64[ns]')
+    days = values.astype('datetime64[D]')
+    if freq == 'week':
+        # 1970-01-01 был четвергом, сдвигаем к понедельнику
+        days = days - ((days.astype('int64') + 3) % 7).astype('timedelta64[D]')
+    return days.astype('datetime64[ns]')
+
+
+def posting_volume(frame, freq='day', query=None, city=None):
+    frame = latest_snapshot(filter_frame(frame, ['published_at', 'salary_mid'], query=query, city=city))
+    if frame.empty:
+        return []
+    published = frame['published_at'].to_numpy(dtype='datetime64[ns]')
+    present = ~np.isnat(published)
+    if not present.any():
+        return []
+
+    periods, inverse = np.unique(_period_starts(published[present], freq), return_inverse=True)
+    with_salary = frame['salary_mid'].notna().to_numpy()[present]
+
+    table = pd.DataFrame({
+        'count': np.bincount(inverse, minlength=len(periods)),
+        'with_salary': np.bincount(inverse, weights=with_salary, minlength=len(periods)).astype('int64'),
+    }, index=pd.DatetimeIndex(periods))
+    full_range = pd.date_range(periods[0], periods[-1], freq=VOLUME_FREQUENCIES[freq])
+    table = table.reindex(full_range, fill_value=0)
+
+    table.index = table.index.strftime('%Y-%m-%d')
+    return _records(table.rename_axis('period').reset_index())
+
+
+def top_employers(frame, query=None, limit=10, city=None):
+    frame = filter_frame(frame, ['query', 'company', 'salary_mid'], query=query, city=city)
+    frame = latest_snapshot(frame, keys=('query', 'job_id'))
+    frame = frame[frame['company'].notna().to_numpy()]
+    if frame.empty:
+        return []
+
+    grouped = frame.groupby(['query', 'company'], observed=True)
+    table = pd.DataFrame({
+        'count': grouped.size(),
+        'with_salary': grouped['salary_mid'].count(),
+        'median_salary': grouped['salary_mid'].median(),
+    }).reset_index()
+
+    table = table.sort_values(['query', 'count'], ascending=[True, False])
+    table = table.groupby('query', observed=True, sort=False).head(limit)
+    return _records(table)
+
+
+def _records(table):
+    table = table.astype('object').where(table.notna(), None)
+    records = table.to_dict('records')
+    for record in records:
+        for name, value in record.items():
+            if isinstance(value, float):
+                record[name] = round(value, 2)
+            elif isinstance(value, np.integer):
+                record[name] = int(value)
+    return records
+
+
+def sync(store, search_ids=None):
+    if search_ids is None:
+        mirrored = set(store.load(columns=['search_id'])['search_id'].dropna().astype('int64').unique())
+        search_ids = db.session.execute(
+            db.select(SearchQuery.id)
+            .where(SearchQuery.status == SearchQuery.STATUS_DONE)
+            .order_by(SearchQuery.id)
+        ).scalars().all()
+        search_ids = [search_id for search_id in search_ids if search_id not in mirrored]
+
+    written = 0
+    for search_id in search_ids:
+        if store.mirror_search(search_id):
+            written += 1
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Колоночное хранилище вакансий для аналитики')
+    parser.add_argument('command', choices=['sync', 'compact', 'stats'])
+    parser.add_argument('--search', type=int, nargs='*', help='выгрузить только эти поиски')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('BACKGROUND_WORKERS', '0')
+    from app import app, analytics_store
+
+    with app.app_context():
+        if args.command == 'sync':
+            written = sync(analytics_store, args.search)
+            print(f" Выгружено поисков: {written}")
+        elif args.command == 'compact':
+            print(f" Сжато разделов: {analytics_store.compact()}")
+        else:
+            print(f" {analytics_store.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+AREAS_URL = 'https://api.hh.ru/areas'
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'areas.json')
+
+ALIASES = {
+    'мск': 'Москва',
+    'спб': 'Санкт-Петербург',
+    'питер': 'Санкт-Петербург',
+    'екб': 'Екатеринбург',
+    'ростов': 'Ростов-на-Дону',
+    'новгород': 'Великий Новгород',
+}
+
+FUZZY_THRESHOLD = 0.55
+FUZZY_MARGIN = 0.1
+RETRY_INTERVAL = 600
+
+
+class AreasUnavailable(Exception):
+    pass
+
+
+class UnknownAreaError(ValueError):
+
+    def __init__(self, name, suggestions=None):
+        self.name = name
+        self.suggestions = suggestions or []
+        super().__init__(f"Неизвестный город: {name}")
+
+
+def normalize(name):
+    name = str(name).lower().replace('ё', 'е').replace('-', ' ')
+    return ' '.join(name.split())
+
+
+def trigrams(name):
+    padded = f'  {name} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def flatten(tree, parent=None):
+    for node in tree:
+        yield {
+            'id': int(node['id']),
+            'name': node['name'],
+            'parent': parent['name'] if parent else None,
+            'leaf': not node.get('areas'),
+        }
+        yield from flatten(node.get('areas') or [], node)
+
+
+class AreaIndex:
+
+    def __init__(self, areas, aliases=None):
+        self.areas = list(areas)
+        self._by_id = {}
+        self._by_name = {}
+        self._prefixes = []
+        self._grams = {}
+        self._gram_sets = []
+
+        for idx, area in enumerate(self.areas):
+            self._by_id[area['id']] = idx
+            name = normalize(area['name'])
+            # при совпадении названий (город и одноимённый регион) предпочитаем город
+            if name not in self._by_name or area['leaf']:
+                self._by_name[name] = idx
+
+            words = name.split(' ')
+            for i in range(len(words)):
+                self._prefixes.append((' '.join(words[i:]), idx))
+
+            grams = trigrams(name)
+            self._gram_sets.append(grams)
+            for gram in grams:
+                self._grams.setdefault(gram, []).append(idx)
+
+        for alias, name in (aliases or {}).items():
+            idx = self._by_name.get(normalize(name))
+            if idx is not None:
+                self._by_name.setdefault(normalize(alias), idx)
+                self._prefixes.append((normalize(alias), idx))
+
+        self._prefixes.sort()
+
+    @classmethod
+    def from_tree(cls, tree, aliases=ALIASES):
+        return cls(flatten(tree), aliases)
+
+    @classmethod
+    def load(cls, path=SNAPSHOT_PATH):
+        with open(path, encoding='utf-8') as f:
+            index = cls.from_tree(json.load(f))
+        logger.info(f"Загружен справочник регионов hh.ru: {len(index)} записей")
+        return index
+
+    def __len__(self):
+        return len(self.areas)
+
+    def get(self, area_id):
+        idx = self._by_id.get(int(area_id))
+        return self._public(idx) if idx is not None else None
+
+    def resolve(self, name):
+        if isinstance(name, int) or str(name).strip().isdigit():
+            area_id = int(name)
+            return self.get(area_id) or {'id': area_id, 'name': str(area_id), 'parent': None}
+
+        key = normalize(name)
+        if not key:
+            return None
+
+        idx = self._by_name.get(key)
+        if idx is not None:
+            return self._public(idx)
+
+        prefixed = self._prefix_matches(key)
+        if len(prefixed) == 1:
+            return self._public(prefixed[0])
+
+        if not prefixed:
+            scored = self._fuzzy_matches(key)
+            if scored and scored[0][0] >= FUZZY_THRESHOLD:
+                if len(scored) == 1 or scored[0][0] - scored[1][0] >= FUZZY_MARGIN:
+                    return self._public(scored[0][1])
+
+        return None
+
+    def suggest(self, text, limit=10):
+        key = normalize(text)
+        if not key:
+            return []
+
+        found = self._prefix_matches(key)
+        found.sort(key=lambda idx: (not self.areas[idx]['leaf'], len(self.areas[idx]['name'])))
+
+        if len(found) < limit:
+            for score, idx in self._fuzzy_matches(key):
+                if score < FUZZY_THRESHOLD / 2:
+                    break
+                if idx not in found:
+                    found.append(idx)
+
+        return [self._public(idx) for idx in found[:limit]]
+
+    def _prefix_matches(self, key):
+        found = []
+        pos = bisect_left(self._prefixes, (key, -1))
+        while pos < len(self._prefixes) and self._prefixes[pos][0].startswith(key):
+            idx = self._prefixes[pos][1]
+            if idx not in found:
+                found.append(idx)
+            pos += 1
+        return found
+
+    def _fuzzy_matches(self, key):
+        grams = trigrams(key)
+        shared = {}
+        for gram in grams:
+            for idx in self._grams.get(gram, ()):
+                shared[idx] = shared.get(idx, 0) + 1
+
+        scored = [(2 * count / (len(grams) + len(self._gram_sets[idx])), idx)
+                  for idx, count in shared.items()]
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored
+
+    def _public(self, idx):
+        area = self.areas[idx]
+        return {'id': area['id'], 'name': area['name'], 'parent': area['parent']}
+
+
+_index = None
+_index_lock = threading.Lock()
+_source = {'path': SNAPSHOT_PATH, 'url': AREAS_URL}
+_download = {'thread': None, 'failed_at': None}
+
+
+def configure(path=None, url=None):
+    global _index
+    with _index_lock:
+        _source['path'] = path or SNAPSHOT_PATH
+        _source['url'] = url or AREAS_URL
+        _download['failed_at'] = None
+        _index = None
+
+
+def _load_snapshot():
+    global _index
+    with _index_lock:
+        if _index is None and os.path.exists(_source['path']):
+            _index = AreaIndex.load(_source['path'])
+        return _index
+
+
+def load_area_index():
+    path, url = _source['path'], _source['url']
+    if not os.path.exists(path):
+        logger.info(f"Справочник регионов не найден, загружаем {url}")
+        try:
+            refresh_snapshot(path, url)
+        except Exception as e:
+            _download['failed_at'] = time.monotonic()
+            logger.error(f"Не удалось загрузить справочник регионов {url}: {e}")
+    return _load_snapshot()
+
+
+def _schedule_download():
+    with _index_lock:
+        thread, failed_at = _download['thread'], _download['failed_at']
+        if thread is not None and thread.is_alive():
+            return
+        if failed_at is not None and time.monotonic() - failed_at < RETRY_INTERVAL:
+            return
+        thread = threading.Thread(target=load_area_index, name='areas-download', daemon=True)
+        _download['thread'] = thread
+    thread.start()
+
+
+def preload_area_index():
+    # снимок читается при старте; если его нет, он скачивается в фоне и запуск не ждёт hh.ru
+    if _load_snapshot() is None:
+        _schedule_download()
+
+
+def get_area_index():
+    index = _index if _index is not None else _load_snapshot()
+    if index is None:
+        _schedule_download()
+        raise AreasUnavailable(f"справочник регионов hh.ru не загружен ({_source['path']}), "
+                               f"выполните python -m parser.areas refresh")
+    return index
+
+
+def resolve_area_id(city, default=1):
+    if not city:
+        return default
+    area = get_area_index().resolve(city)
+    if area is None:
+        raise UnknownAreaError(city, [item['name'] for item in get_area_index().suggest(city, limit=5)])
+    return area['id']
+
+
+def refresh_snapshot(path=SNAPSHOT_PATH, url=AREAS_URL):
+    import requests
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    response = requests.get(url, headers={'User-Agent': 'job-parser/1.0'}, timeout=30)
+    response.raise_for_status()
+    tree = response.json()
+    # разбираем дерево до записи, чтобы битый ответ не заменил рабочий снимок
+    count = len(AreaIndex.from_tree(tree))
+    if not count:
+        raise ValueError(f"Пустой справочник регионов: {url}")
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(tree, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+    logger.info(f"Справочник регионов обновлён: {count} записей -> {path}")
+    return count
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['refresh']:
+        print("Использование: python -m parser.areas refresh")
+        sys.exit(2)
+    from config import Config
+    refresh_snapshot(Config.HH_AREAS_PATH, Config.HH_AREAS_URL)
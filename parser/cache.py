@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def cache_key(params):
+    normalized = []
+    for key, value in sorted(params.items()):
+        if isinstance(value, str):
+            value = ' '.join(value.lower().split())
+        normalized.append((key, str(value)))
+    return urlencode(normalized)
+
+
+class CacheEntry:
+
+    def __init__(self, data, etag=None, last_modified=None, expires_at=0):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+    def is_fresh(self):
+        return time.time() < self.expires_at
+
+    def validators(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class MemoryPageCache:
+
+    def __init__(self, ttl=300, max_entries=1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry.is_fresh():
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def set(self, key, data, etag=None, last_modified=None):
+        entry = CacheEntry(data, etag, last_modified, time.time() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def touch(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.expires_at = time.time() + self.ttl
+                self._entries.move_to_end(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLitePageCache:
+
+    def __init__(self, path, ttl=300, max_entries=1000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS page_cache ('
+            'key TEXT PRIMARY KEY, data TEXT NOT NULL, etag TEXT, last_modified TEXT, '
+            'expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS ix_page_cache_accessed_at ON page_cache (accessed_at)')
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data, etag, last_modified, expires_at FROM page_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute('UPDATE page_cache SET accessed_at = ? WHERE key = ?', (time.time(), key))
+
+        entry = CacheEntry(json.loads(row[0]), row[1], row[2], row[3])
+        if entry.is_fresh():
+            self.hits += 1
+        else:
+            self.misses += 1
+        return entry
+
+    def set(self, key, data, etag=None, last_modified=None):
+        now = time.time()
+        payload = json.dumps(data, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO page_cache (key, data, etag, last_modified, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, payload, etag, last_modified, now + self.ttl, now)
+            )
+            self._conn.execute(
+                'DELETE FROM page_cache WHERE key IN ('
+                'SELECT key FROM page_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def touch(self, key):
+        now = time.time()
+        with self._lock:
+            self._conn.execute('UPDATE page_cache SET expires_at = ?, accessed_at = ? WHERE key = ?',
+                               (now + self.ttl, now, key))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM page_cache')
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM page_cache').fetchone()[0]
+
+
+def create_cache(backend='memory', ttl=300, max_entries=1000, path=None):
+    if not backend or backend == 'none':
+        return None
+    if backend == 'memory':
+        return MemoryPageCache(ttl=ttl, max_entries=max_entries)
+    if backend == 'sqlite':
+        return SQLitePageCache(path, ttl=ttl, max_entries=max_entries)
+    raise ValueError(f"Неизвестный тип кэша: {backend}")
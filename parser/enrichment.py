@@ -0,0 +1,181 @@
+import logging
+import re
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from html.parser import HTMLParser
+
+from sqlalchemy import or_, update
+
+from parser.governor import CircuitOpen
+from parser.models import db, Job, search_query_jobs
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HH_ID_RE = re.compile(r'/vacancy/(\d+)')
+BLOCK_TAGS = {'p', 'br', 'li', 'ul', 'ol', 'div', 'h1', 'h2', 'h3', 'h4', 'tr'}
+
+
+class _TextExtractor(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        self.parts.append(data)
+
+
+def html_to_text(html):
+    extractor = _TextExtractor()
+    extractor.feed(html or '')
+    extractor.close()
+    lines = (' '.join(line.split()) for line in ''.join(extractor.parts).splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def vacancy_hh_id(hh_id, url):
+    if hh_id:
+        return hh_id
+    match = HH_ID_RE.search(url or '')
+    return match.group(1) if match else None
+
+
+def parse_details(data):
+    skills = [skill.get('name') for skill in data.get('key_skills') or [] if skill.get('name')]
+    employment = (data.get('employment') or {}).get('name') or ''
+    return {
+        'description': html_to_text(data.get('description')),
+        'requirements': ', '.join(skills),
+        'employment_type': employment[:50],
+    }
+
+
+def select_pending(search_id, ttl):
+    link = search_query_jobs.c
+    cutoff = datetime.utcnow() - ttl
+    return db.session.execute(
+        db.select(Job.id, Job.hh_id, Job.url, Job.details_etag)
+        .join(search_query_jobs, link.job_id == Job.id)
+        .where(link.search_query_id == search_id)
+        .where(or_(Job.enriched_at.is_(None), Job.enriched_at < cutoff))
+        .order_by(Job.id)
+    ).all()
+
+
+class VacancyEnricher:
+
+    def __init__(self, client, max_workers=4, batch_size=50, ttl=timedelta(days=7)):
+        self.client = client
+        self.max_workers = max(1, max_workers)
+        self.batch_size = batch_size
+        self.ttl = ttl
+
+    def enrich_search(self, search_id, on_batch=None):
+        rows = select_pending(search_id, self.ttl)
+        logger.info(f"Дозагрузка описаний для поиска {search_id}: вакансий к обработке {len(rows)}")
+        return self.enrich(rows, on_batch)
+
+    def enrich(self, rows, on_batch=None):
+        stats = {'total': len(rows), 'updated': 0, 'unchanged': 0, 'missing': 0, 'skipped': 0, 'failed': 0}
+        if on_batch:
+            on_batch(dict(stats, processed=0))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='hh-details') as executor:
+            for i in range(0, len(rows), self.batch_size):
+                batch = rows[i:i + self.batch_size]
+                updates = []
+                now = datetime.utcnow()
+
+                for row, result in zip(batch, executor.map(self._fetch, batch)):
+                    status, data, etag = result
+                    if status == 200:
+                        updates.append(dict(parse_details(data), id=row.id, details_etag=etag, enriched_at=now))
+                        stats['updated'] += 1
+                    elif status == 304:
+                        updates.append({'id': row.id, 'enriched_at': now})
+                        stats['unchanged'] += 1
+                    elif status in (403, 404):
+                        updates.append({'id': row.id, 'enriched_at': now})
+                        stats['missing'] += 1
+                    elif status == 'skipped':
+                        stats['skipped'] += 1
+                    else:
+                        stats['failed'] += 1
+
+                if updates:
+                    db.session.execute(update(Job), updates)
+                db.session.commit()
+
+                if on_batch:
+                    on_batch(dict(stats, processed=min(i + self.batch_size, len(rows))))
+
+        logger.info(f"Дозагрузка описаний завершена: {stats}")
+        return stats
+
+    def _fetch(self, row):
+        hh_id = vacancy_hh_id(row.hh_id, row.url)
+        if not hh_id:
+            return 'skipped', None, None
+        try:
+            return self.client.fetch_vacancy(hh_id, row.details_etag)
+        except CircuitOpen:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка загрузки вакансии {hh_id}: {e}")
+            return None, None, None
+
+
+class EnrichmentRunner:
+
+    def __init__(self, app, create_enricher, max_workers=1):
+        self.app = app
+        self.create_enricher = create_enricher
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='enrich')
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def submit(self, search_id):
+        with self._lock:
+            state = self._states.get(search_id)
+            if state and state['status'] in ('queued', 'running'):
+                return dict(state), False
+            state = {'status': 'queued', 'total': 0, 'processed': 0, 'error': None,
+                     'started_at': None, 'finished_at': None}
+            self._states[search_id] = state
+        self._executor.submit(self._run, search_id)
+        return dict(state), True
+
+    def status(self, search_id):
+        with self._lock:
+            state = self._states.get(search_id)
+            return dict(state) if state else None
+
+    def _update(self, search_id, **fields):
+        with self._lock:
+            self._states[search_id].update(fields)
+
+    def _run(self, search_id):
+        self._update(search_id, status='running', started_at=datetime.utcnow().isoformat())
+        with self.app.app_context():
+            try:
+                enricher = self.create_enricher()
+                stats = enricher.enrich_search(search_id, on_batch=lambda stats: self._update(search_id, **stats))
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Ошибка дозагрузки описаний для поиска {search_id}: {e}")
+                traceback.print_exc()
+                self._update(search_id, status='error', error=str(e)[:1000],
+                             finished_at=datetime.utcnow().isoformat())
+                return
+            finally:
+                db.session.remove()
+
+        self._update(search_id, status='done', processed=stats['total'],
+                     finished_at=datetime.utcnow().isoformat(), **stats)
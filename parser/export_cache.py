@@ -0,0 +1,86 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def export_key(search_id, format_type, version):
+    raw = '|'.join(str(part) for part in (search_id, format_type) + tuple(version))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class ExportCache:
+
+    def __init__(self, folder, max_bytes=200 * 1024 * 1024):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def path_for(self, key, ext):
+        return os.path.join(self.folder, f'{key}.{ext}')
+
+    def get(self, key, ext):
+        path = self.path_for(key, ext)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, ext, write):
+        fd, tmp_path = tempfile.mkstemp(dir=self.folder, prefix='.tmp-', suffix=f'.{ext}')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            return self.commit(tmp_path, key, ext)
+        except Exception:
+            self.discard(tmp_path)
+            raise
+
+    def open_temp(self, ext):
+        fd, tmp_path = tempfile.mkstemp(dir=self.folder, prefix='.tmp-', suffix=f'.{ext}')
+        return os.fdopen(fd, 'wb'), tmp_path
+
+    def commit(self, tmp_path, key, ext):
+        path = self.path_for(key, ext)
+        os.replace(tmp_path, path)
+        self.evict()
+        return path
+
+    def discard(self, tmp_path):
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        with self._lock:
+            files = []
+            total = 0
+            for entry in os.scandir(self.folder):
+                if not entry.is_file() or entry.name.startswith('.tmp-'):
+                    continue
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+            files.sort()
+            removed = 0
+            for _, size, path in files:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+
+        if removed:
+            logger.info(f"Удалено устаревших выгрузок: {removed}")
+        return removed
@@ -0,0 +1,88 @@
+import logging
+import queue
+import threading
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def split_cities(city):
+    if not city:
+        return []
+    parts = [part.strip() for part in city.replace(';', ',').split(',')]
+    unique = []
+    for part in parts:
+        if part and part.lower() not in (p.lower() for p in unique):
+            unique.append(part)
+    return unique
+
+
+class MultiAreaSearch:
+
+    def __init__(self, client):
+        self.client = client
+
+    def resolve_areas(self, cities):
+        areas = []
+        for city in cities:
+            area_id = self.client._get_city_id(city)
+            if area_id not in areas:
+                areas.append(area_id)
+        return areas
+
+    def search_vacancies(self, query, cities, max_pages=3):
+        all_vacancies = []
+        for vacancies in self.iter_pages(query, cities, max_pages):
+            all_vacancies.extend(vacancies)
+        return all_vacancies
+
+    def iter_pages(self, query, cities, max_pages=3):
+        area_ids = self.resolve_areas(cities)
+        logger.info(f"Поиск по нескольким регионам: '{query}', ID: {area_ids}, страниц на регион: {max_pages}")
+
+        pages = queue.Queue()
+        done = object()
+        stop = threading.Event()
+
+        def fetch(area_id):
+            try:
+                for vacancies in self.client.iter_pages(query, str(area_id), max_pages):
+                    if stop.is_set():
+                        break
+                    pages.put(vacancies)
+            except Exception as e:
+                logger.error(f"Ошибка поиска в регионе {area_id}: {e}")
+                # ошибку получает потребитель: поиск не должен завершиться без части регионов
+                pages.put(e)
+            finally:
+                pages.put(done)
+
+        workers = [threading.Thread(target=fetch, args=(area_id,), name=f'area-{area_id}', daemon=True)
+                   for area_id in area_ids]
+        for worker in workers:
+            worker.start()
+
+        seen = set()
+        remaining = len(workers)
+        try:
+            while remaining:
+                item = pages.get()
+                if item is done:
+                    remaining -= 1
+                    continue
+                if isinstance(item, Exception):
+                    raise item
+
+                unique = []
+                for vac in item:
+                    key = vac.get('hh_id') or vac.get('url')
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    unique.append(vac)
+                if unique:
+                    yield unique
+        finally:
+            stop.set()
+
+        logger.info(f"Поиск по регионам завершён: уникальных вакансий {len(seen)}")
@@ -0,0 +1,201 @@
+import logging
+import re
+from html import escape
+
+from sqlalchemy import column, func, literal_column, or_, table, text
+from markupsafe import Markup
+
+from parser.models import db, Job
+from parser.queries import filter_salary
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'jobs_fts'
+
+jobs_fts = table(FTS_TABLE, column('rowid'), column(FTS_TABLE))
+
+FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "title, company, description, content='jobs', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')",
+
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON jobs BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, company, description) "
+    "VALUES (new.id, new.title, new.company, new.description); END",
+
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON jobs BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, company, description) "
+    "VALUES ('delete', old.id, old.title, old.company, old.description); END",
+
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, company, description ON jobs BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, company, description) "
+    "VALUES ('delete', old.id, old.title, old.company, old.description); "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, company, description) "
+    "VALUES (new.id, new.title, new.company, new.description); END",
+]
+
+# веса bm25 для колонок title, company, description
+RANK_WEIGHTS = (10.0, 4.0, 1.0)
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = re.compile(r'(?:(?<=[ая])(?:в|вши|вшись)|(?:ив|ивши|ившись|ыв|ывши|ывшись))$')
+REFLEXIVE = re.compile(r'(?:ся|сь)$')
+ADJECTIVE = re.compile(r'(?:ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$')
+PARTICIPLE = re.compile(r'(?:(?<=[ая])(?:ем|нн|вш|ющ|щ)|(?:ивш|ывш|ующ))$')
+VERB = re.compile(r'(?:(?<=[ая])(?:ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)|'
+                  r'(?:ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|'
+                  r'ить|ыть|ишь|ую|ю))$')
+NOUN = re.compile(r'(?:а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|'
+                  r'ию|ью|ю|ия|ья|я)$')
+DERIVATIONAL = re.compile(r'(?:ост|ость)$')
+SUPERLATIVE = re.compile(r'(?:ейш|ейше)$')
+
+
+def _regions(word):
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    if not re.fullmatch(r'[а-я]+', word):
+        return word
+
+    rv, r2 = _regions(word)
+    head, tail = word[:rv], word[rv:]
+    r2 = max(0, r2 - rv)
+
+    stripped = PERFECTIVE_GERUND.sub('', tail, count=1)
+    if stripped == tail:
+        tail = REFLEXIVE.sub('', tail, count=1)
+        stripped = ADJECTIVE.sub('', tail, count=1)
+        if stripped != tail:
+            stripped = PARTICIPLE.sub('', stripped, count=1)
+        else:
+            stripped = VERB.sub('', tail, count=1)
+            if stripped == tail:
+                stripped = NOUN.sub('', tail, count=1)
+    tail = stripped
+
+    if tail.endswith('и'):
+        tail = tail[:-1]
+    if len(tail) > r2 and DERIVATIONAL.search(tail[r2:]):
+        tail = DERIVATIONAL.sub('', tail, count=1)
+
+    if tail.endswith('нн'):
+        tail = tail[:-1]
+    else:
+        superlative = SUPERLATIVE.sub('', tail, count=1)
+        if superlative != tail:
+            tail = superlative[:-1] if superlative.endswith('нн') else superlative
+        elif tail.endswith('ь'):
+            tail = tail[:-1]
+
+    return head + tail
+
+
+def build_match(query):
+    terms = []
+    for word in WORD_RE.findall(query or ''):
+        if len(word) < 2:
+            continue
+        root = stem(word)
+        if len(root) < 3:
+            root = word.lower()
+        terms.append(f'"{root}"*')
+    return ' '.join(terms)
+
+
+def is_supported(engine):
+    return engine.dialect.name == 'sqlite'
+
+
+def install(db):
+    if not is_supported(db.engine):
+        return False
+
+    with db.engine.begin() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+        ), {'name': FTS_TABLE}).first()
+        for statement in FTS_DDL:
+            conn.execute(text(statement))
+        if not exists:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+            logger.info("Создан полнотекстовый индекс вакансий")
+    return not exists
+
+
+def _highlight(fragment):
+    return Markup(escape(fragment or '')
+                  .replace(SNIPPET_START, '<mark>')
+                  .replace(SNIPPET_END, '</mark>'))
+
+
+def search_jobs(query, city=None, page=1, per_page=20, **salary):
+    page = max(1, page)
+    match = build_match(query)
+    if not match:
+        return [], 0
+
+    if not is_supported(db.engine):
+        return _search_like(query, city, page, per_page, **salary)
+
+    fts = literal_column(FTS_TABLE)
+    rank = func.bm25(fts, *RANK_WEIGHTS).label('rank')
+    snippet = func.snippet(fts, 2, SNIPPET_START, SNIPPET_END, '…', 16).label('snippet')
+
+    stmt = (
+        db.select(Job.id, rank, snippet)
+        .select_from(jobs_fts)
+        .join(Job, Job.id == jobs_fts.c.rowid)
+        .where(jobs_fts.c[FTS_TABLE].match(match))
+    )
+    if city:
+        stmt = stmt.where(Job.city == city)
+    stmt = filter_salary(stmt, **salary)
+
+    total = db.session.execute(db.select(func.count()).select_from(stmt.subquery())).scalar()
+    rows = db.session.execute(
+        stmt.order_by(rank).limit(per_page).offset((page - 1) * per_page)
+    ).all()
+
+    jobs = {job.id: job for job in db.session.execute(
+        db.select(Job).where(Job.id.in_([row.id for row in rows]))
+    ).scalars()}
+
+    results = [(jobs[row.id], _highlight(row.snippet)) for row in rows if row.id in jobs]
+    return results, total
+
+
+def _search_like(query, city, page, per_page, **salary):
+    stmt = db.select(Job)
+    for word in WORD_RE.findall(query):
+        pattern = f'%{stem(word)}%'
+        stmt = stmt.where(or_(Job.title.ilike(pattern), Job.company.ilike(pattern)))
+    if city:
+        stmt = stmt.where(Job.city == city)
+    stmt = filter_salary(stmt, **salary)
+
+    total = db.session.execute(db.select(func.count()).select_from(stmt.subquery())).scalar()
+    jobs = db.session.execute(
+        stmt.order_by(Job.published_at.desc()).limit(per_page).offset((page - 1) * per_page)
+    ).scalars().all()
+    return [(job, None) for job in jobs], total
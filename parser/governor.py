@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from parser.rate_limit import TokenBucket
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUSES = (429, 503)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpen(Exception):
+
+    def __init__(self, retry_in):
+        self.retry_in = retry_in
+        super().__init__(f"hh.ru временно недоступен, повторите через {int(retry_in) + 1} с")
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+class RequestGovernor:
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, rate=5, min_rate=0.5, max_rate=None, increase=0.5, decrease=0.5,
+                 max_retries=3, backoff_base=0.5, backoff_max=30,
+                 failure_threshold=5, recovery_timeout=30, bucket=None):
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate * 2
+        self.increase = increase
+        self.decrease = decrease
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self.bucket = bucket or TokenBucket(rate)
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+        self.counters = {
+            'requests': 0,
+            'ok': 0,
+            'throttled': 0,
+            'server_errors': 0,
+            'network_errors': 0,
+            'client_errors': 0,
+            'retries': 0,
+            'gave_up': 0,
+            'circuit_opened': 0,
+            'shed': 0,
+        }
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def check(self):
+        with self._lock:
+            self._check_circuit()
+
+    def _check_circuit(self):
+        if self.state != self.OPEN:
+            return
+        retry_in = self._opened_at + self.recovery_timeout - time.monotonic()
+        if retry_in > 0:
+            self.counters['shed'] += 1
+            raise CircuitOpen(retry_in)
+        self.state = self.HALF_OPEN
+        logger.info("Пробный запрос к hh.ru после паузы")
+
+    def try_acquire(self):
+        with self._lock:
+            self._check_circuit()
+            pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            return pause
+        return self.bucket.try_acquire()
+
+    def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def record(self, status=None, retry_after=None):
+        with self._lock:
+            self.counters['requests'] += 1
+
+            if status is not None and status < 400:
+                self.counters['ok'] += 1
+                self._failures = 0
+                if self.state != self.CLOSED:
+                    logger.info("hh.ru снова отвечает, нагрузка восстановлена")
+                self.state = self.CLOSED
+                self.bucket.set_rate(min(self.max_rate, self.rate + self.increase / max(self.rate, 1)))
+                return False
+
+            if status in THROTTLE_STATUSES:
+                self.counters['throttled'] += 1
+                self.bucket.set_rate(max(self.min_rate, self.rate * self.decrease))
+                if retry_after:
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                logger.warning(f"hh.ru ограничивает запросы ({status}), скорость снижена до {self.rate:.2f}/с")
+
+            if status is None:
+                self.counters['network_errors'] += 1
+            elif status >= 500:
+                self.counters['server_errors'] += 1
+            elif status != 429:
+                self.counters['client_errors'] += 1
+                return False
+
+            if status is None or status >= 500:
+                self._failures += 1
+                if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                    self._open()
+
+            return status is None or status in RETRY_STATUSES
+
+    def _open(self):
+        if self.state != self.OPEN:
+            self.counters['circuit_opened'] += 1
+            logger.error(f"hh.ru недоступен, новые запросы приостановлены на {self.recovery_timeout} с")
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+
+    def backoff(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return max(delay, retry_after or 0)
+
+    def _should_retry(self, attempt, status, retry_after):
+        if not self.record(status, retry_after):
+            return None
+        if attempt >= self.max_retries:
+            with self._lock:
+                self.counters['gave_up'] += 1
+            return None
+        with self._lock:
+            self.counters['retries'] += 1
+        delay = self.backoff(attempt, retry_after)
+        logger.info(f"Повтор запроса через {delay:.2f} с (попытка {attempt + 2} из {self.max_retries + 1})")
+        return delay
+
+    def send(self, request, inspect, errors=()):
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                result = request()
+            except errors:
+                delay = self._should_retry(attempt, None, None)
+                if delay is None:
+                    raise
+            else:
+                status, retry_after = inspect(result)
+                delay = self._should_retry(attempt, status, parse_retry_after(retry_after))
+                if delay is None:
+                    return result
+            time.sleep(delay)
+            attempt += 1
+
+    async def send_async(self, request, inspect, errors=()):
+        attempt = 0
+        while True:
+            await self.acquire_async()
+            try:
+                result = await request()
+            except errors:
+                delay = self._should_retry(attempt, None, None)
+                if delay is None:
+                    raise
+            else:
+                status, retry_after = inspect(result)
+                delay = self._should_retry(attempt, status, parse_retry_after(retry_after))
+                if delay is None:
+                    return result
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, rate=round(self.rate, 3), state=self.state,
+                        paused_for=round(max(0.0, self._paused_until - time.monotonic()), 3))
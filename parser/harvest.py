@@ -0,0 +1,325 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from datetime import datetime
+
+from parser.areas import AreasUnavailable
+from parser.fanout import MultiAreaSearch, split_cities
+from parser.governor import RequestGovernor, CircuitOpen
+from parser.hh_api_parser import HHAPIParser, PageFetchError
+from parser.rate_limit import SharedTokenBucket
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CIRCUIT_RETRIES = 3
+
+_worker_parser = None
+
+
+class HarvestTask:
+
+    def __init__(self, query, city=None, max_pages=3, full_crawl=False):
+        self.query = ' '.join(query.split())
+        self.city = ' '.join((city or '').split()) or None
+        self.max_pages = max_pages
+        self.full_crawl = full_crawl
+
+    @property
+    def key(self):
+        pages = 'full' if self.full_crawl else self.max_pages
+        return f"{self.query.lower()}|{(self.city or '').lower()}|{pages}"
+
+    def __repr__(self):
+        return f'<HarvestTask {self.query!r} {self.city!r}>'
+
+
+def read_tasks(path, max_pages=3, full_crawl=False):
+    tasks = []
+    seen = set()
+    with open(path, encoding='utf-8-sig') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            separator = '\t' if '\t' in line else ';'
+            query, _, city = line.partition(separator)
+            if not query.strip():
+                continue
+            task = HarvestTask(query, city, max_pages, full_crawl)
+            if task.key not in seen:
+                seen.add(task.key)
+                tasks.append(task)
+    return tasks
+
+
+class Checkpoint:
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.done = {}
+        self.failed = {}
+        if resume and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+            self.done = state.get('done', {})
+            self.failed = state.get('failed', {})
+
+    def is_done(self, task):
+        return task.key in self.done
+
+    def mark_done(self, task, **result):
+        self.done[task.key] = dict(result, finished_at=datetime.now().isoformat(timespec='seconds'))
+        self.failed.pop(task.key, None)
+        self.save()
+
+    def mark_failed(self, task, error):
+        self.failed[task.key] = {'error': error, 'failed_at': datetime.now().isoformat(timespec='seconds')}
+        self.save()
+
+    def save(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'done': self.done, 'failed': self.failed}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+class DatabaseSink:
+
+    def __init__(self):
+        os.environ.setdefault('BACKGROUND_WORKERS', '0')
+        from app import app, mirror_search
+        self.app = app
+        self.mirror_search = mirror_search
+
+    def write(self, task, vacancies):
+        from parser.models import db, SearchQuery, Job
+        from parser.persistence import save_vacancies
+
+        with self.app.app_context():
+            search = SearchQuery(query=task.query, city=task.city or 'Москва', max_pages=task.max_pages,
+                                 full_crawl=task.full_crawl, user_key='harvest',
+                                 status=SearchQuery.STATUS_RUNNING, started_at=datetime.utcnow())
+            db.session.add(search)
+            db.session.commit()
+
+            inserted, linked, skipped = save_vacancies(search.id, vacancies)
+            search.results_count = Job.by_search(search.id).count()
+            search.status = SearchQuery.STATUS_DONE
+            search.finished_at = datetime.utcnow()
+            db.session.commit()
+            search_id = search.id
+
+        self.mirror_search(search_id)
+        return {'search_id': search_id, 'saved': inserted}
+
+    def close(self):
+        pass
+
+
+class NDJSONSink:
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, task, vacancies):
+        for vac in vacancies:
+            self._file.write(json.dumps(dict(vac, query=task.query, search_city=task.city),
+                                        ensure_ascii=False, default=str))
+            self._file.write('\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {'saved': len(vacancies)}
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink:
+
+    def __init__(self, path):
+        from parser.analytics import ColumnarStore
+        self.store = ColumnarStore(path)
+
+    def write(self, task, vacancies):
+        import pandas as pd
+        from parser.analytics import prepare_frame
+
+        frame = pd.DataFrame(vacancies)
+        if frame.empty or 'hh_id' not in frame:
+            return {'saved': 0}
+
+        # вне БД идентификатором строки служит id вакансии на hh.ru
+        frame['job_id'] = pd.to_numeric(frame['hh_id'], errors='coerce')
+        frame = frame[frame['job_id'].notna()].drop_duplicates('job_id')
+        frame = prepare_frame(frame, 0, task.query, datetime.utcnow())
+        self.store.append(frame)
+        return {'saved': len(frame)}
+
+    def close(self):
+        pass
+
+
+def create_sink(output, path=None):
+    if output == 'db':
+        return DatabaseSink()
+    if output == 'ndjson':
+        return NDJSONSink(path or f"harvest_{datetime.now():%Y%m%d_%H%M%S}.ndjson")
+    if output == 'parquet':
+        from config import Config
+        return ParquetSink(path or os.path.join(os.path.dirname(Config.ANALYTICS_PATH), 'harvest'))
+    raise ValueError(f"Неизвестный формат вывода: {output}")
+
+
+def _init_worker(bucket, options):
+    global _worker_parser
+    from parser.areas import configure as configure_areas
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_areas(options.get('areas_path'), options.get('areas_url'))
+    governor = RequestGovernor(
+        rate=bucket.rate,
+        min_rate=options['min_rate'],
+        max_rate=options['max_rate'],
+        max_retries=options['max_retries'],
+        bucket=bucket,
+    )
+    _worker_parser = HHAPIParser(concurrent=options['threads'] > 1, max_workers=options['threads'],
+                                 governor=governor, api_url=options['api_url'])
+
+
+def _task_pages(parser, task):
+    if task.full_crawl:
+        from parser.sharding import ShardedCrawler
+        crawler = ShardedCrawler(parser)
+        cities = split_cities(task.city) or [None]
+        for city in cities:
+            yield from crawler.iter_pages(task.query, city)
+        return
+
+    cities = split_cities(task.city)
+    if len(cities) > 1:
+        yield from MultiAreaSearch(parser).iter_pages(task.query, cities, task.max_pages)
+    else:
+        yield from parser.iter_pages(task.query, task.city, task.max_pages)
+
+
+def _harvest(task):
+    started = time.monotonic()
+    for attempt in range(CIRCUIT_RETRIES + 1):
+        try:
+            vacancies = []
+            for page in _task_pages(_worker_parser, task):
+                vacancies.extend(page)
+        except CircuitOpen as e:
+            if attempt == CIRCUIT_RETRIES:
+                return task, None, str(e), time.monotonic() - started
+            time.sleep(e.retry_in)
+            continue
+        except PageFetchError as e:
+            return task, None, str(e), time.monotonic() - started
+        except Exception as e:
+            return task, None, f'{type(e).__name__}: {e}', time.monotonic() - started
+
+        return task, vacancies, None, time.monotonic() - started
+
+
+def harvest(tasks, sink, checkpoint, processes=4, rate=5, threads=1, options=None):
+    pending = [task for task in tasks if not checkpoint.is_done(task)]
+    skipped = len(tasks) - len(pending)
+    if skipped:
+        logger.info(f"Пропущено уже выполненных запросов: {skipped}")
+    if not pending:
+        return {'done': 0, 'failed': 0, 'skipped': skipped, 'vacancies': 0}
+
+    options = dict(options or {}, threads=threads)
+    if options.get('areas_path'):
+        # справочник загружается один раз до запуска процессов, а не в каждом из них
+        from parser.areas import configure as configure_areas, load_area_index
+        configure_areas(options['areas_path'], options.get('areas_url'))
+        if load_area_index() is None and any(task.city for task in pending):
+            raise AreasUnavailable(f"справочник регионов hh.ru не загружен ({options['areas_path']})")
+    bucket = SharedTokenBucket(rate)
+    totals = {'done': 0, 'failed': 0, 'skipped': skipped, 'vacancies': 0}
+
+    with multiprocessing.Pool(min(processes, len(pending)), initializer=_init_worker,
+                              initargs=(bucket, options)) as pool:
+        for task, vacancies, error, elapsed in pool.imap_unordered(_harvest, pending):
+            if error is None:
+                try:
+                    result = sink.write(task, vacancies)
+                except Exception as e:
+                    error = f'запись результата: {e}'
+
+            if error is not None:
+                totals['failed'] += 1
+                checkpoint.mark_failed(task, error)
+                logger.error(f"Ошибка '{task.query}' ({task.city or 'Москва'}): {error}")
+                continue
+
+            totals['done'] += 1
+            totals['vacancies'] += len(vacancies)
+            checkpoint.mark_done(task, found=len(vacancies), seconds=round(elapsed, 1), **result)
+            logger.info(f"[{totals['done'] + totals['failed']}/{len(pending)}] '{task.query}' "
+                        f"({task.city or 'Москва'}): {len(vacancies)} вакансий за {elapsed:.1f} с, "
+                        f"лимит {bucket.rate:.2f} запр/с")
+
+    return totals
+
+
+def main(argv=None):
+    from config import Config
+
+    parser = argparse.ArgumentParser(description='Массовый сбор вакансий hh.ru по списку запросов')
+    parser.add_argument('input', help='файл с запросами: "запрос;город" или "запрос<TAB>город" в каждой строке')
+    parser.add_argument('--output', choices=['db', 'parquet', 'ndjson'], default='db', help='куда сохранять')
+    parser.add_argument('--path', help='файл NDJSON или каталог Parquet')
+    parser.add_argument('--processes', type=int, default=4, help='число процессов')
+    parser.add_argument('--threads', type=int, default=1, help='потоков загрузки страниц в процессе')
+    parser.add_argument('--rate', type=float, default=Config.HH_RATE_LIMIT, help='общий лимит запросов в секунду')
+    parser.add_argument('--pages', type=int, default=3, help='страниц на запрос')
+    parser.add_argument('--full', action='store_true', help='полная выгрузка с разбиением на шарды')
+    parser.add_argument('--checkpoint', help='файл контрольной точки (по умолчанию <input>.checkpoint.json)')
+    parser.add_argument('--resume', action='store_true', help='продолжить с контрольной точки')
+    args = parser.parse_args(argv)
+
+    tasks = read_tasks(args.input, args.pages, args.full)
+    checkpoint = Checkpoint(args.checkpoint or f'{args.input}.checkpoint.json', resume=args.resume)
+    sink = create_sink(args.output, args.path)
+
+    options = {
+        'min_rate': Config.HH_MIN_RATE,
+        'max_rate': args.rate,
+        'max_retries': Config.HH_MAX_RETRIES,
+        'api_url': Config.HH_API_URL,
+        'areas_path': Config.HH_AREAS_PATH,
+        'areas_url': Config.HH_AREAS_URL,
+    }
+
+    print(f" Запросов: {len(tasks)}, процессов: {args.processes}, общий лимит: {args.rate} запр/с, "
+          f"вывод: {args.output}")
+    started = time.monotonic()
+    try:
+        totals = harvest(tasks, sink, checkpoint, args.processes, args.rate, args.threads, options)
+    except AreasUnavailable as e:
+        print(f" Ошибка: {e}")
+        return 1
+    except KeyboardInterrupt:
+        print(f"\n Прервано, продолжить: добавьте --resume (контрольная точка {checkpoint.path})")
+        return 130
+    finally:
+        sink.close()
+
+    print(f" Готово за {time.monotonic() - started:.1f} с: выполнено {totals['done']}, "
+          f"ошибок {totals['failed']}, пропущено {totals['skipped']}, вакансий {totals['vacancies']}")
+    return 1 if totals['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
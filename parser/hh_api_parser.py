@@ -1,86 +1,210 @@
 import requests
-import time
 import logging
-from datetime import datetime
-import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from requests.adapters import HTTPAdapter
+
+from parser.areas import resolve_area_id
+from parser.cache import cache_key
+from parser.governor import RequestGovernor, CircuitOpen
+from parser.salary import NO_SALARY, format_salary_range, parse_api_salary
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def to_utc_naive(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class PageFetchError(Exception):
+
+    def __init__(self, page, reason):
+        self.page = page
+        super().__init__(f"hh.ru не отдал страницу {page + 1}: {reason}")
+
+
 class HHAPIParser:
 
     API_URL = "https://api.hh.ru/vacancies"
+    PER_PAGE = 20
+
+    def __init__(self, concurrent=False, max_workers=4, rate_limit=5, governor=None, cache=None, api_url=None):
+        self.concurrent = concurrent
+        self.API_URL = api_url or self.API_URL
+        self.max_workers = max(1, max_workers)
+        self.governor = governor or RequestGovernor(rate_limit)
+        self.cache = cache
 
-    def __init__(self):
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount('https://', adapter)
         self.session.headers.update({
             'User-Agent': 'python-requests/2.31.0',
             'Accept': 'application/json',
         })
 
-    def search_vacancies(self, query, city=None, max_pages=3):
-
+    def search_vacancies(self, query, city=None, max_pages=3, concurrent=None, date_from=None):
         all_vacancies = []
-        page = 0
+        for vacancies in self.iter_pages(query, city, max_pages, concurrent, date_from):
+            all_vacancies.extend(vacancies)
+
+        logger.info(f"Всего получено вакансий: {len(all_vacancies)}")
+        return all_vacancies
+
+    def iter_pages(self, query, city=None, max_pages=3, concurrent=None, date_from=None):
 
         area_id = self._get_city_id(city) if city else 1
 
+        if self.concurrent if concurrent is None else concurrent:
+            yield from self._iter_pages_concurrent(query, area_id, max_pages, date_from)
+            return
+
+        page = 0
+
         logger.info(f"Поиск: '{query}', город ID: {area_id}, страниц: {max_pages}")
 
         while page < max_pages:
-            try:
-                params = {
-                    'text': query,
-                    'area': area_id,
-                    'page': page,
-                    'per_page': 20,
-                    'order_by': 'publication_time',
-                    'period': 30,
-                }
-
-                logger.info(f"Запрос API страницы {page + 1} для '{query}'")
+            logger.info(f"Запрос API страницы {page + 1} для '{query}'")
 
-                time.sleep(random.uniform(1, 2))
+            data = self._get_page(self._build_params(query, area_id, page, date_from))
 
-                response = self.session.get(self.API_URL, params=params, timeout=10)
+            items = data.get('items', [])
+            logger.info(f"Найдено вакансий на странице: {len(items)}")
 
-                if response.status_code != 200:
-                    logger.error(f"Ошибка API: {response.status_code}")
-                    logger.error(f"URL: {response.url}")
-                    logger.error(f"Ответ: {response.text[:200]}")
-                    break
+            vacancies = self._parse_items(items)
+            yield vacancies
 
-                data = response.json()
+            if self._reached_watermark(vacancies, date_from):
+                logger.info("Достигнуты уже известные вакансии")
+                break
 
-                if 'items' not in data:
-                    logger.error("Нет поля 'items' в ответе")
-                    break
+            pages = data.get('pages', 1)
+            if page >= pages - 1:
+                logger.info("Достигнута последняя страница")
+                break
 
-                items = data.get('items', [])
-                logger.info(f"Найдено вакансий на странице: {len(items)}")
+            page += 1
 
-                for item in items:
-                    vacancy = self._parse_api_vacancy(item)
-                    if vacancy:
-                        all_vacancies.append(vacancy)
+    def _iter_pages_concurrent(self, query, area_id, max_pages, date_from=None):
+        logger.info(f"Параллельный поиск: '{query}', город ID: {area_id}, страниц: {max_pages}, "
+                    f"потоков: {self.max_workers}")
 
-                pages = data.get('pages', 1)
-                if page >= pages - 1:
-                    logger.info("Достигнута последняя страница")
-                    break
+        first = self._get_page(self._build_params(query, area_id, 0, date_from))
+        vacancies = self._parse_items(first.get('items', []))
+        pages = min(first.get('pages', 1), max_pages)
+        if self._reached_watermark(vacancies, date_from):
+            pages = 1
 
-                page += 1
+        if pages <= 1:
+            yield vacancies
+            return
 
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Ошибка сети: {e}")
-                break
-            except Exception as e:
-                logger.error(f"Неожиданная ошибка: {e}")
-                break
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, pages - 1))
+        try:
+            futures = [executor.submit(self._get_page, self._build_params(query, area_id, page, date_from))
+                       for page in range(1, pages)]
+
+            yield vacancies
+
+            for future in futures:
+                yield self._parse_items(future.result().get('items', []))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _build_params(self, query, area_id, page, date_from=None):
+        params = {
+            'text': query,
+            'area': area_id,
+            'page': page,
+            'per_page': self.PER_PAGE,
+            'order_by': 'publication_time',
+        }
+        if date_from:
+            params['date_from'] = to_utc_naive(date_from).strftime('%Y-%m-%dT%H:%M:%S+0000')
+        else:
+            params['period'] = 30
+        return params
+
+    @staticmethod
+    def _reached_watermark(vacancies, date_from):
+        if not date_from:
+            return False
+        watermark = to_utc_naive(date_from)
+        return any(to_utc_naive(vac['published_at']) <= watermark
+                   for vac in vacancies if vac.get('published_at'))
+
+    def _cache_lookup(self, params):
+        if self.cache is None:
+            return None, None
+        key = cache_key(params)
+        return key, self.cache.get(key)
+
+    def _cache_store(self, key, data, headers):
+        if self.cache is not None:
+            self.cache.set(key, data, etag=headers.get('ETag'), last_modified=headers.get('Last-Modified'))
+
+    def _fetch_page(self, params):
+        key, entry = self._cache_lookup(params)
+        if entry is not None and entry.is_fresh():
+            logger.info(f"Страница {params['page'] + 1} получена из кэша")
+            return entry.data
+
+        response = self.governor.send(
+            lambda: self.session.get(self.API_URL, params=params, timeout=10,
+                                     headers=entry.validators() if entry else None),
+            lambda response: (response.status_code, response.headers.get('Retry-After')),
+            errors=(requests.exceptions.RequestException,),
+        )
+
+        if response.status_code == 304 and entry is not None:
+            logger.info(f"Страница {params['page'] + 1} не изменилась, используем кэш")
+            self.cache.touch(key)
+            return entry.data
+
+        if response.status_code != 200:
+            logger.error(f"URL: {response.url}")
+            logger.error(f"Ответ: {response.text[:200]}")
+            raise PageFetchError(params['page'], f"ошибка API {response.status_code}")
+
+        data = response.json()
+
+        if 'items' not in data:
+            raise PageFetchError(params['page'], "нет поля 'items' в ответе")
+
+        self._cache_store(key, data, response.headers)
+        return data
+
+    def fetch_vacancy(self, hh_id, etag=None):
+        response = self.governor.send(
+            lambda: self.session.get(f'{self.API_URL}/{hh_id}', timeout=10,
+                                     headers={'If-None-Match': etag} if etag else None),
+            lambda response: (response.status_code, response.headers.get('Retry-After')),
+            errors=(requests.exceptions.RequestException,),
+        )
+        data = response.json() if response.status_code == 200 else None
+        return response.status_code, data, response.headers.get('ETag')
+
+    def _get_page(self, params):
+        try:
+            return self._fetch_page(params)
+        except (CircuitOpen, PageFetchError):
+            raise
+        except requests.exceptions.RequestException as e:
+            raise PageFetchError(params['page'], f"ошибка сети: {e}") from e
+        except Exception as e:
+            raise PageFetchError(params['page'], f"{type(e).__name__}: {e}") from e
 
-        logger.info(f"Всего получено вакансий: {len(all_vacancies)}")
-        return all_vacancies
+    def _parse_items(self, items):
+        vacancies = []
+        for item in items:
+            vacancy = self._parse_api_vacancy(item)
+            if vacancy:
+                vacancies.append(vacancy)
+        return vacancies
 
     def _parse_api_vacancy(self, item):
         try:
@@ -88,14 +212,14 @@ class HHAPIParser:
                 return None
 
             vacancy = {
+                'hh_id': item.get('id'),
                 'title': item.get('name', ''),
                 'company': 'Не указано',
-                'salary': 'Не указана',
                 'city': 'Не указан',
                 'experience': 'Не указан',
                 'url': item.get('alternate_url', ''),
                 'description': '',
-                'published_at': datetime.now()
+                'published_at': datetime.utcnow()
             }
 
             employer = item.get('employer', {})
@@ -106,20 +230,9 @@ class HHAPIParser:
             if area:
                 vacancy['city'] = area.get('name', 'Не указан')
 
-            salary = item.get('salary')
-            if salary and isinstance(salary, dict):
-                salary_from = salary.get('from')
-                salary_to = salary.get('to')
-                currency = salary.get('currency', 'руб')
-
-                if salary_from and salary_to:
-                    vacancy['salary'] = f"{salary_from} - {salary_to} {currency}"
-                elif salary_from:
-                    vacancy['salary'] = f"от {salary_from} {currency}"
-                elif salary_to:
-                    vacancy['salary'] = f"до {salary_to} {currency}"
-                else:
-                    vacancy['salary'] = 'Не указана'
+            salary_from, salary_to, currency, gross = parse_api_salary(item.get('salary'))
+            vacancy.update(salary_from=salary_from, salary_to=salary_to, currency=currency, gross=gross,
+                           salary=format_salary_range(salary_from, salary_to, currency, gross) or NO_SALARY)
 
             experience = item.get('experience', {})
             if experience:
@@ -146,28 +259,4 @@ class HHAPIParser:
             return None
 
     def _get_city_id(self, city_name):
-
-        if not city_name:
-            return 1
-        cities = {
-            'москва': 1,
-            'санкт-петербург': 2,
-            'спб': 2,
-            'екатеринбург': 3,
-            'новосибирск': 4,
-            'казань': 88,
-            'нижний новгород': 66,
-            'ростов-на-дону': 76,
-            'самара': 78,
-            'уфа': 99,
-            'краснодар': 53,
-            'воронеж': 26,
-            'пермь': 72,
-            'волгоград': 24,
-            'челябинск': 104,
-            'омск': 68,
-            'тюмень': 95,
-        }
-
-        city_lower = city_name.lower().strip()
-        return cities.get(city_lower, 1)
\ No newline at end of file
+        return resolve_area_id(city_name)
\ No newline at end of file
@@ -0,0 +1,227 @@
+import asyncio
+import atexit
+import logging
+import queue
+import threading
+
+import aiohttp
+
+from parser.hh_api_parser import HHAPIParser, PageFetchError
+from parser.governor import CircuitOpen
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class HHAsyncClient(HHAPIParser):
+
+    def __init__(self, max_workers=4, rate_limit=5, max_connections=20, governor=None, cache=None,
+                 api_url=None):
+        super().__init__(concurrent=True, max_workers=max_workers, rate_limit=rate_limit,
+                         governor=governor, cache=cache, api_url=api_url)
+        self.max_connections = max_connections
+
+        self._loop = None
+        self._thread = None
+        self._http = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever,
+                                                name='hh-async-client', daemon=True)
+                self._thread.start()
+                logger.info("Запущен общий event loop HH клиента")
+            return self._loop
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def _get_http(self):
+        if self._http is None or self._http.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._http = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=10),
+                headers={
+                    'User-Agent': 'python-requests/2.31.0',
+                    'Accept': 'application/json',
+                },
+            )
+        return self._http
+
+    def search_vacancies(self, query, city=None, max_pages=3, concurrent=None, date_from=None):
+        return self.run(self.search_vacancies_async(query, city, max_pages, date_from))
+
+    async def search_vacancies_async(self, query, city=None, max_pages=3, date_from=None):
+        all_vacancies = []
+        async for vacancies in self.iter_pages_async(query, city, max_pages, date_from):
+            all_vacancies.extend(vacancies)
+
+        logger.info(f"Всего получено вакансий: {len(all_vacancies)}")
+        return all_vacancies
+
+    def iter_pages(self, query, city=None, max_pages=3, concurrent=None, date_from=None):
+        pages = queue.Queue()
+        done = object()
+
+        async def produce():
+            try:
+                async for vacancies in self.iter_pages_async(query, city, max_pages, date_from):
+                    pages.put(vacancies)
+            except BaseException as e:
+                pages.put(e)
+                raise
+            finally:
+                pages.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(produce(), self.loop)
+        try:
+            while True:
+                item = pages.get()
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    async def iter_pages_async(self, query, city=None, max_pages=3, date_from=None):
+        area_id = self._get_city_id(city) if city else 1
+
+        logger.info(f"Асинхронный поиск: '{query}', город ID: {area_id}, страниц: {max_pages}")
+
+        first = await self._fetch_page_async(self._build_params(query, area_id, 0, date_from))
+        vacancies = self._parse_items(first.get('items', []))
+        pages = min(first.get('pages', 1), max_pages)
+        if self._reached_watermark(vacancies, date_from):
+            pages = 1
+
+        if pages <= 1:
+            yield vacancies
+            return
+
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def fetch(page):
+            async with semaphore:
+                return await self._fetch_page_async(self._build_params(query, area_id, page, date_from))
+
+        tasks = [asyncio.ensure_future(fetch(page)) for page in range(1, pages)]
+        try:
+            yield vacancies
+
+            for task in tasks:
+                data = await task
+                yield self._parse_items(data.get('items', []))
+        finally:
+            for task in tasks:
+                if task.done() and not task.cancelled():
+                    # ошибки остальных страниц уже не нужны, первая ушла вызывающему коду
+                    task.exception()
+                task.cancel()
+
+    def _fetch_page(self, params):
+        return self.run(self._fetch_page_async(params))
+
+    async def _fetch_page_async(self, params):
+        key, entry = self._cache_lookup(params)
+        if entry is not None and entry.is_fresh():
+            logger.info(f"Страница {params['page'] + 1} получена из кэша")
+            return entry.data
+
+        async def request():
+            http = await self._get_http()
+            async with http.get(self.API_URL, params=self._encode_params(params),
+                                headers=entry.validators() if entry else None) as response:
+                if response.status == 200:
+                    body = await response.json()
+                else:
+                    body = await response.text()
+                return response.status, response.headers, body, response.url
+
+        try:
+            status, headers, body, url = await self.governor.send_async(
+                request,
+                lambda result: (result[0], result[1].get('Retry-After')),
+                errors=(aiohttp.ClientError, asyncio.TimeoutError),
+            )
+        except CircuitOpen:
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise PageFetchError(params['page'], f"ошибка сети: {e!r}") from e
+        except Exception as e:
+            raise PageFetchError(params['page'], f"{type(e).__name__}: {e}") from e
+
+        if status == 304 and entry is not None:
+            logger.info(f"Страница {params['page'] + 1} не изменилась, используем кэш")
+            self.cache.touch(key)
+            return entry.data
+
+        if status != 200:
+            logger.error(f"URL: {url}")
+            logger.error(f"Ответ: {body[:200]}")
+            raise PageFetchError(params['page'], f"ошибка API {status}")
+
+        data = body
+
+        if 'items' not in data:
+            raise PageFetchError(params['page'], "нет поля 'items' в ответе")
+
+        self._cache_store(key, data, headers)
+        return data
+
+    def fetch_vacancy(self, hh_id, etag=None):
+        return self.run(self.fetch_vacancy_async(hh_id, etag))
+
+    async def fetch_vacancy_async(self, hh_id, etag=None):
+        async def request():
+            http = await self._get_http()
+            async with http.get(f'{self.API_URL}/{hh_id}',
+                                headers={'If-None-Match': etag} if etag else None) as response:
+                data = await response.json() if response.status == 200 else None
+                return response.status, data, response.headers.get('ETag'), response.headers
+
+        status, data, new_etag, _ = await self.governor.send_async(
+            request,
+            lambda result: (result[0], result[3].get('Retry-After')),
+            errors=(aiohttp.ClientError, asyncio.TimeoutError),
+        )
+        return status, data, new_etag
+
+    @staticmethod
+    def _encode_params(params):
+        return {key: str(value) for key, value in params.items()}
+
+    async def aclose(self):
+        if self._http is not None and not self._http.closed:
+            await self._http.close()
+        self._http = None
+
+    def close(self):
+        if self._loop is None:
+            return
+        try:
+            self.run(self.aclose())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop = None
+            self._thread = None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client(**kwargs):
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HHAsyncClient(**kwargs)
+            atexit.register(_client.close)
+        return _client
@@ -1,12 +1,13 @@
 import requests
-import time
 import re
 from bs4 import BeautifulSoup
 from fake_useragent import UserAgent
 from datetime import datetime
 from urllib.parse import quote, urlencode
 import logging
-import random
+
+from parser.areas import resolve_area_id
+from parser.governor import RequestGovernor, CircuitOpen
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,7 +17,8 @@ class HHParser:
     BASE_URL = "https://hh.ru"
     SEARCH_URL = "https://hh.ru/search/vacancy"
 
-    def __init__(self):
+    def __init__(self, governor=None):
+        self.governor = governor or RequestGovernor(rate=0.5, max_rate=1)
         self.ua = UserAgent()
         self.session = requests.Session()
         self.session.headers.update({
@@ -31,76 +33,16 @@ class HHParser:
         })
 
     def _get_city_id(self, city_name):
+        return resolve_area_id(city_name)
 
-        if not city_name:
-            return 1
-        cities = {
-            'москва': 1,
-            'санкт-петербург': 2,
-            'спб': 2,
-            'екатеринбург': 3,
-            'новосибирск': 4,
-            'казань': 88,
-            'нижний новгород': 66,
-            'ростов-на-дону': 76,
-            'самара': 78,
-            'уфа': 99,
-            'краснодар': 53,
-            'воронеж': 26,
-            'пермь': 72,
-            'волгоград': 24,
-            'челябинск': 104,
-            'омск': 68,
-            'тюмень': 95,
-            'ижевск': 44,
-            'барнаул': 10,
-            'иркутск': 46,
-            'хабаровск': 30,
-            'ярославль': 16,
-            'владивосток': 22,
-            'красноярск': 54,
-            'саратов': 79,
-            'рязань': 77,
-            'липецк': 61,
-            'пенза': 71,
-            'киров': 50,
-            'тула': 93,
-            'чебоксары': 103,
-            'калининград': 22,
-            'мурманск': 64,
-            'архангельск': 9,
-            'владимир': 23,
-            'смоленск': 83,
-            'тверь': 90,
-            'белгород': 13,
-            'курск': 59,
-            'орёл': 69,
-            'псков': 73,
-            'новгород': 67,
-            'кострома': 56,
-            'иваново': 43,
-            'брянск': 19,
-            'калуга': 48,
-            'магадан': 62,
-            'петрозаводск': 31,
-            'сыктывкар': 86,
-            'нальчик': 65,
-            'грозный': 34,
-            'махачкала': 63,
-            'ставрополь': 85,
-            'астрахань': 11,
-            'элиста': 38,
-            'ростов': 76,
-            'севастополь': 119,
-            'симферополь': 118,
-            'донецк': 107,
-            'луганск': 108,
-            'запорожье': 109,
-            'херсон': 110,
-        }
-
-        city_lower = city_name.lower().strip()
-        return cities.get(city_lower, 1)
+    def _get(self, url, timeout=15):
+        response = self.governor.send(
+            lambda: self.session.get(url, timeout=timeout),
+            lambda response: (response.status_code, response.headers.get('Retry-After')),
+            errors=(requests.exceptions.RequestException,),
+        )
+        response.raise_for_status()
+        return response
 
     def search_vacancies(self, query, city=None, max_pages=3):
 
@@ -130,10 +72,7 @@ class HHParser:
 
                 logger.info(f"Запрос страницы {page + 1}: {url[:100]}...")
 
-                time.sleep(random.uniform(2, 4))
-
-                response = self.session.get(url, timeout=15)
-                response.raise_for_status()
+                response = self._get(url, timeout=15)
 
                 response.encoding = 'utf-8'
 
@@ -150,8 +89,9 @@ class HHParser:
                 else:
                     logger.info("Больше вакансий не найдено, завершаем поиск")
                     break
-                time.sleep(random.uniform(3, 5))
 
+            except CircuitOpen:
+                raise
             except requests.exceptions.RequestException as e:
                 logger.error(f"Ошибка при запросе: {e}")
                 break
@@ -335,16 +275,13 @@ class HHParser:
 
         vacancy['description'] = desc_elem.get_text().strip() if desc_elem else ''
 
-        vacancy['published_at'] = datetime.now()
+        vacancy['published_at'] = datetime.utcnow()
 
         return vacancy
 
     def get_vacancy_details(self, url):
         try:
-            time.sleep(random.uniform(1, 2))
-
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
+            response = self._get(url, timeout=10)
             response.encoding = 'utf-8'
 
             soup = BeautifulSoup(response.text, 'lxml')
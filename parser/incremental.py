@@ -0,0 +1,80 @@
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from parser.hh_api_parser import to_utc_naive
+from parser.models import db, SearchWatermark
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PERIOD_DAYS = 30
+
+
+def normalize_query(query):
+    return ' '.join((query or '').lower().split())[:200]
+
+
+def get_watermark(query, area_id, max_pages):
+    watermark = db.session.execute(
+        db.select(SearchWatermark).where(
+            SearchWatermark.query_key == normalize_query(query),
+            SearchWatermark.area_id == area_id,
+        )
+    ).scalar_one_or_none()
+
+    if watermark is None or watermark.newest_published_at is None or watermark.last_search_id is None:
+        return None
+    if (watermark.max_pages or 0) < max_pages:
+        return None
+    if watermark.newest_published_at < datetime.utcnow() - timedelta(days=PERIOD_DAYS):
+        return None
+    return watermark
+
+
+def link_previous_results(search_id, watermark):
+    result = db.session.execute(text(
+        "INSERT INTO search_query_jobs (search_query_id, job_id, seq) "
+        "SELECT :search_id, l.job_id, l.seq FROM search_query_jobs l "
+        "JOIN jobs j ON j.id = l.job_id "
+        "WHERE l.search_query_id = :last_search_id AND j.published_at >= :since "
+        "AND NOT EXISTS (SELECT 1 FROM search_query_jobs x "
+        "WHERE x.search_query_id = :search_id AND x.job_id = l.job_id)"
+    ), {
+        'search_id': search_id,
+        'last_search_id': watermark.last_search_id,
+        'since': datetime.utcnow() - timedelta(days=PERIOD_DAYS),
+    })
+    logger.info(f"Перенесено вакансий из поиска {watermark.last_search_id}: {result.rowcount}")
+    return result.rowcount
+
+
+def newest_published(vacancies, newest=None):
+    for vac in vacancies:
+        if vac.get('published_at'):
+            published = to_utc_naive(vac['published_at'])
+            if newest is None or published > newest:
+                newest = published
+    return newest
+
+
+def update_watermark(query, area_id, max_pages, search_id, newest, previous=None):
+    if previous is not None and previous.newest_published_at:
+        newest = max(newest, previous.newest_published_at) if newest else previous.newest_published_at
+
+    watermark = previous or db.session.execute(
+        db.select(SearchWatermark).where(
+            SearchWatermark.query_key == normalize_query(query),
+            SearchWatermark.area_id == area_id,
+        )
+    ).scalar_one_or_none()
+
+    if watermark is None:
+        watermark = SearchWatermark(query_key=normalize_query(query), area_id=area_id)
+        db.session.add(watermark)
+
+    watermark.newest_published_at = newest
+    watermark.last_search_id = search_id
+    watermark.max_pages = max(max_pages, watermark.max_pages or 0) if previous else max_pages
+    return watermark
@@ -0,0 +1,160 @@
+import logging
+
+from sqlalchemy import inspect, text
+
+from parser.fulltext import install as install_fulltext
+from parser.salary import NO_SALARY, parse_salary_text
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# индексы, которые больше не используют запросы приложения: выдача поиска идёт через search_query_jobs
+OBSOLETE_INDEXES = {
+    'jobs': ['ix_jobs_search_query_id_published_at'],
+}
+
+
+def _column_ddl(column, dialect):
+    ddl = f"{column.name} {column.type.compile(dialect=dialect)}"
+    default = column.default
+    if default is not None and default.is_scalar:
+        value = default.arg
+        if isinstance(value, str):
+            value = "'" + value.replace("'", "''") + "'"
+        elif isinstance(value, bool):
+            value = int(value)
+        ddl += f" DEFAULT {value}"
+    return ddl
+
+
+def add_missing_columns(db):
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {col['name'] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN "
+                                  f"{_column_ddl(column, db.engine.dialect)}"))
+                added.append(f"{table.name}.{column.name}")
+
+    if added:
+        logger.info(f"Добавлены колонки: {', '.join(added)}")
+    return added
+
+
+def add_missing_indexes(db):
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                index.create(conn)
+                added.append(index.name)
+
+    if added:
+        logger.info(f"Созданы индексы: {', '.join(added)}")
+    return added
+
+
+def drop_obsolete_indexes(db):
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    dropped = []
+
+    with db.engine.begin() as conn:
+        for table, names in OBSOLETE_INDEXES.items():
+            if table not in existing_tables:
+                continue
+            existing = {index['name'] for index in inspector.get_indexes(table)}
+            for name in names:
+                if name in existing:
+                    conn.execute(text(f"DROP INDEX {name}"))
+                    dropped.append(name)
+
+    if dropped:
+        logger.info(f"Удалены индексы: {', '.join(dropped)}")
+    return dropped
+
+
+def backfill_search_links(db):
+    with db.engine.begin() as conn:
+        result = conn.execute(text(
+            "INSERT INTO search_query_jobs (search_query_id, job_id, seq) "
+            "SELECT j.search_query_id, j.id, j.id FROM jobs j "
+            "WHERE j.search_query_id IS NOT NULL AND NOT EXISTS ("
+            "SELECT 1 FROM search_query_jobs l "
+            "WHERE l.search_query_id = j.search_query_id AND l.job_id = j.id)"
+        ))
+    if result.rowcount:
+        logger.info(f"Перенесено связей поиск-вакансия: {result.rowcount}")
+
+
+def backfill_link_seq(db):
+    with db.engine.begin() as conn:
+        result = conn.execute(text("UPDATE search_query_jobs SET seq = job_id WHERE seq IS NULL"))
+    if result.rowcount:
+        logger.info(f"Заполнен порядок связей поиск-вакансия: {result.rowcount}")
+
+
+def backfill_salary_columns(db, chunk_size=1000):
+    update = text("UPDATE jobs SET salary_from = :salary_from, salary_to = :salary_to, "
+                  "currency = :currency, gross = :gross WHERE id = :id")
+    updated = 0
+
+    with db.engine.begin() as conn:
+        rows = conn.execute(text(
+            "SELECT id, salary FROM jobs WHERE salary IS NOT NULL AND salary != :empty "
+            "AND salary_from IS NULL AND salary_to IS NULL"
+        ), {'empty': NO_SALARY}).all()
+
+        params = []
+        for job_id, salary in rows:
+            salary_from, salary_to, currency, gross = parse_salary_text(salary)
+            if salary_from is None and salary_to is None:
+                continue
+            params.append({'id': job_id, 'salary_from': salary_from, 'salary_to': salary_to,
+                           'currency': currency, 'gross': gross})
+
+        for i in range(0, len(params), chunk_size):
+            conn.execute(update, params[i:i + chunk_size])
+        updated = len(params)
+
+    if updated:
+        logger.info(f"Заполнены числовые поля зарплаты: {updated}")
+    return updated
+
+
+def upgrade(db):
+    existing_tables = set(inspect(db.engine).get_table_names())
+    db.create_all()
+    added = add_missing_columns(db)
+    added += add_missing_indexes(db)
+    drop_obsolete_indexes(db)
+
+    if 'jobs' in existing_tables and 'search_query_jobs' not in existing_tables:
+        backfill_search_links(db)
+
+    if 'search_query_jobs.seq' in added:
+        backfill_link_seq(db)
+
+    if 'jobs.salary_from' in added:
+        backfill_salary_columns(db)
+
+    if install_fulltext(db):
+        added.append('jobs_fts')
+
+    return added
@@ -1,11 +1,34 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 
+from parser.salary import display_salary
+
 db = SQLAlchemy()
 
 
+search_query_jobs = db.Table(
+    'search_query_jobs',
+    db.Column('search_query_id', db.Integer, db.ForeignKey('search_queries.id', ondelete='CASCADE'),
+              primary_key=True),
+    db.Column('job_id', db.Integer, db.ForeignKey('jobs.id', ondelete='CASCADE'), primary_key=True),
+    # порядок привязки вакансий к поиску, курсор для потоковой выдачи
+    db.Column('seq', db.Integer),
+    db.Index('ix_search_query_jobs_job_id', 'job_id'),
+    db.Index('ix_search_query_jobs_seq', 'search_query_id', 'seq'),
+)
+
+
 class SearchQuery(db.Model):
     __tablename__ = 'search_queries'
+    __table_args__ = (
+        db.Index('ix_search_queries_created_at', 'created_at'),
+        db.Index('ix_search_queries_status', 'status'),
+    )
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_ERROR = 'error'
 
     id = db.Column(db.Integer, primary_key=True)
     query = db.Column(db.String(200), nullable=False)
@@ -13,14 +36,30 @@ class SearchQuery(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     results_count = db.Column(db.Integer, default=0)
 
-    jobs = db.relationship('Job', backref='search', lazy=True, cascade='all, delete-orphan')
+    max_pages = db.Column(db.Integer, default=3)
+    full_crawl = db.Column(db.Boolean, default=False)
+    status = db.Column(db.String(20), default=STATUS_DONE)
+    priority = db.Column(db.Integer, default=0)
+    user_key = db.Column(db.String(100))
+    error = db.Column(db.Text)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    jobs = db.relationship('Job', secondary=search_query_jobs, backref='searches', lazy=True)
 
     def __repr__(self):
         return f'<SearchQuery {self.query}>'
 
+    @property
+    def is_active(self):
+        return self.status in (self.STATUS_QUEUED, self.STATUS_RUNNING)
+
 
 class Job(db.Model):
     __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_city_title', 'city', 'title'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -34,21 +73,109 @@ class Job(db.Model):
     employment_type = db.Column(db.String(50))
     published_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     search_query_id = db.Column(db.Integer, db.ForeignKey('search_queries.id'))
+    hh_id = db.Column(db.String(20), index=True)
+    salary_from = db.Column(db.Integer, index=True)
+    salary_to = db.Column(db.Integer, index=True)
+    currency = db.Column(db.String(10))
+    gross = db.Column(db.Boolean)
+    details_etag = db.Column(db.String(100))
+    enriched_at = db.Column(db.DateTime)
 
     def __repr__(self):
         return f'<Job {self.title}>'
 
+    @classmethod
+    def by_search(cls, search_id):
+        return cls.query.join(search_query_jobs, search_query_jobs.c.job_id == cls.id).filter(
+            search_query_jobs.c.search_query_id == search_id)
+
+    @property
+    def has_salary(self):
+        return self.salary_from is not None or self.salary_to is not None
+
+    @property
+    def salary_display(self):
+        return display_salary(self.salary_from, self.salary_to, self.currency, self.gross, self.salary)
+
+    def to_api_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'company': self.company,
+            'salary': self.salary,
+            'salary_display': self.salary_display,
+            'salary_from': self.salary_from,
+            'salary_to': self.salary_to,
+            'currency': self.currency,
+            'gross': self.gross,
+            'city': self.city,
+            'experience': self.experience,
+            'published_at': self.published_at.strftime('%d.%m.%Y') if self.published_at else None,
+            'url': self.url,
+        }
+
     def to_dict(self):
         return {
             'Название': self.title,
             'Компания': self.company,
-            'Зарплата': self.salary,
+            'Зарплата': self.salary_display,
             'Город': self.city,
             'Опыт работы': self.experience,
             'Тип занятости': self.employment_type,
             'Дата публикации': self.published_at.strftime('%d.%m.%Y') if self.published_at else '',
             'Ссылка': self.url,
             'Описание': self.description[:200] + '...' if self.description and len(
-                self.description) > 200 else self.description
-        }
\ No newline at end of file
+                self.description) > 200 else self.description,
+            'Ключевые навыки': self.requirements or '',
+        }
+
+
+class SearchWatermark(db.Model):
+    __tablename__ = 'search_watermarks'
+    __table_args__ = (
+        db.UniqueConstraint('query_key', 'area_id', name='uq_search_watermarks_query_area'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    query_key = db.Column(db.String(200), nullable=False)
+    area_id = db.Column(db.Integer, nullable=False)
+    newest_published_at = db.Column(db.DateTime)
+    max_pages = db.Column(db.Integer, default=0)
+    last_search_id = db.Column(db.Integer, db.ForeignKey('search_queries.id', ondelete='SET NULL'))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SearchWatermark {self.query_key} {self.area_id}>'
+
+
+class Watchlist(db.Model):
+    __tablename__ = 'watchlists'
+    __table_args__ = (
+        db.UniqueConstraint('user_key', 'query_key', name='uq_watchlists_user_query'),
+        db.Index('ix_watchlists_active_next_refresh_at', 'active', 'next_refresh_at'),
+        db.Index('ix_watchlists_query_key', 'query_key'),
+        db.Index('ix_watchlists_pending_search_id', 'pending_search_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    query = db.Column(db.String(200), nullable=False)
+    city = db.Column(db.String(100))
+    max_pages = db.Column(db.Integer, default=3)
+    query_key = db.Column(db.String(400), nullable=False)
+    refresh_minutes = db.Column(db.Integer, default=24 * 60)
+    user_key = db.Column(db.String(100))
+    active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_refreshed_at = db.Column(db.DateTime)
+    next_refresh_at = db.Column(db.DateTime)
+    last_search_id = db.Column(db.Integer, db.ForeignKey('search_queries.id', ondelete='SET NULL'))
+    # обновление, которое ещё выполняется; в last_search_id попадает только после успешного завершения
+    pending_search_id = db.Column(db.Integer, db.ForeignKey('search_queries.id', ondelete='SET NULL'))
+
+    last_search = db.relationship('SearchQuery', foreign_keys=[last_search_id])
+    pending_search = db.relationship('SearchQuery', foreign_keys=[pending_search_id])
+
+    def __repr__(self):
+        return f'<Watchlist {self.query} {self.city}>'
@@ -0,0 +1,117 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import func, insert, select
+
+from parser.hh_api_parser import to_utc_naive
+from parser.models import db, Job, search_query_jobs
+from parser.salary import parse_salary_text
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _dialect_insert(table, dialect_name, conflict_columns):
+    if dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(table).on_conflict_do_nothing(index_elements=conflict_columns)
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(table).on_conflict_do_nothing(index_elements=conflict_columns)
+    return insert(table)
+
+
+def _rowcount(result, default):
+    if result.rowcount is not None and result.rowcount >= 0:
+        return result.rowcount
+    return default
+
+
+def vacancy_to_row(vac, search_id):
+    title = vac.get('title', '')
+    if not title or len(title.strip()) < 2:
+        return None
+
+    if 'salary_from' in vac or 'salary_to' in vac:
+        salary_from, salary_to, currency, gross = (vac.get('salary_from'), vac.get('salary_to'),
+                                                   vac.get('currency'), vac.get('gross'))
+    else:
+        salary_from, salary_to, currency, gross = parse_salary_text(vac.get('salary'))
+
+    return {
+        'title': title[:200],
+        'company': (vac.get('company') or 'Не указано')[:200],
+        'salary': (vac.get('salary') or 'Не указана')[:100],
+        'city': (vac.get('city') or 'Не указан')[:100],
+        'experience': (vac.get('experience') or '')[:100],
+        'url': vac.get('url', '')[:500] if vac.get('url') else '',
+        # hh.ru отдаёт время по Москве; в БД храним UTC, как и водяные знаки инкрементального поиска
+        'published_at': to_utc_naive(vac['published_at']) if vac.get('published_at') else datetime.utcnow(),
+        'description': str(vac.get('description', ''))[:1000] if vac.get('description') else '',
+        'search_query_id': search_id,
+        'hh_id': str(vac['hh_id']) if vac.get('hh_id') else None,
+        'salary_from': salary_from,
+        'salary_to': salary_to,
+        'currency': currency,
+        'gross': gross,
+        'created_at': datetime.utcnow(),
+    }
+
+
+def _select_in(column, key_column, values, chunk_size):
+    found = {}
+    for i in range(0, len(values), chunk_size):
+        rows = db.session.execute(
+            select(key_column, column).where(key_column.in_(values[i:i + chunk_size]))
+        )
+        found.update((key, value) for key, value in rows)
+    return found
+
+
+def save_vacancies(search_id, vacancies, chunk_size=500):
+    rows = []
+    seen_urls = set()
+    skipped = 0
+
+    for vac in vacancies:
+        row = vacancy_to_row(vac, search_id)
+        if row is None or row['url'] in seen_urls:
+            skipped += 1
+            continue
+        seen_urls.add(row['url'])
+        rows.append(row)
+
+    jobs = Job.__table__
+    dialect = db.engine.dialect.name
+    urls = list(seen_urls)
+
+    job_ids = _select_in(jobs.c.id, jobs.c.url, urls, chunk_size)
+    new_rows = [row for row in rows if row['url'] not in job_ids]
+
+    inserted = 0
+    if new_rows:
+        stmt = _dialect_insert(jobs, dialect, ['url'])
+        for i in range(0, len(new_rows), chunk_size):
+            chunk = new_rows[i:i + chunk_size]
+            inserted += _rowcount(db.session.execute(stmt, chunk), len(chunk))
+        job_ids.update(_select_in(jobs.c.id, jobs.c.url, [row['url'] for row in new_rows], chunk_size))
+
+    linked = 0
+    links = []
+    if job_ids:
+        link = search_query_jobs.c
+        last_seq = db.session.execute(
+            select(func.coalesce(func.max(link.seq), 0)).where(link.search_query_id == search_id)
+        ).scalar()
+        links = [{'search_query_id': search_id, 'job_id': job_id, 'seq': last_seq + i}
+                 for i, job_id in enumerate(job_ids.values(), 1)]
+    if links:
+        stmt = _dialect_insert(search_query_jobs, dialect, ['search_query_id', 'job_id'])
+        for i in range(0, len(links), chunk_size):
+            chunk = links[i:i + chunk_size]
+            linked += _rowcount(db.session.execute(stmt, chunk), len(chunk))
+
+    skipped += len(rows) - len(job_ids)
+
+    logger.info(f"Пакетное сохранение: новых {inserted}, привязано {linked}, пропущено {skipped}")
+    return inserted, linked, skipped
@@ -0,0 +1,67 @@
+import threading
+import time
+
+
+class ProgressTracker:
+
+    FINISHED_TTL = 300
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._states = {}
+
+    def update(self, search_id, **fields):
+        with self._cond:
+            state = self._states.setdefault(search_id, {
+                'status': 'queued',
+                'pages': 0,
+                'vacancies': 0,
+                'saved': 0,
+                'results_count': 0,
+                'error': None,
+                'version': 0,
+                'finished': None,
+            })
+            state.update(fields)
+            state['version'] += 1
+            self._prune()
+            self._cond.notify_all()
+            return dict(state)
+
+    def advance(self, search_id, pages=0, vacancies=0, saved=0, **fields):
+        with self._cond:
+            state = self._states.get(search_id) or {}
+            return self.update(
+                search_id,
+                pages=state.get('pages', 0) + pages,
+                vacancies=state.get('vacancies', 0) + vacancies,
+                saved=state.get('saved', 0) + saved,
+                **fields
+            )
+
+    def finish(self, search_id, status, error=None):
+        return self.update(search_id, status=status, error=error, finished=time.monotonic())
+
+    def get(self, search_id):
+        with self._cond:
+            state = self._states.get(search_id)
+            return dict(state) if state else None
+
+    def wait(self, search_id, version, timeout=15):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                state = self._states.get(search_id)
+                if state is not None and state['version'] != version:
+                    return dict(state)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def _prune(self):
+        now = time.monotonic()
+        expired = [search_id for search_id, state in self._states.items()
+                   if state['finished'] and now - state['finished'] > self.FINISHED_TTL]
+        for search_id in expired:
+            del self._states[search_id]
@@ -0,0 +1,120 @@
+from sqlalchemy import and_, func, case, or_
+
+from parser.models import db, Job, search_query_jobs
+
+DEFAULT_CURRENCY = 'RUR'
+
+
+def filter_salary(stmt, salary_min=None, salary_max=None, currency=None):
+    # диапазоны по самим колонкам, без coalesce, чтобы работали индексы salary_from/salary_to
+    if salary_min is not None:
+        stmt = stmt.where(or_(Job.salary_to >= salary_min,
+                              and_(Job.salary_to.is_(None), Job.salary_from >= salary_min)))
+    if salary_max is not None:
+        stmt = stmt.where(or_(Job.salary_from <= salary_max,
+                              and_(Job.salary_from.is_(None), Job.salary_to <= salary_max)))
+    if salary_min is not None or salary_max is not None:
+        # суммы в разных валютах с одним порогом не сравниваем
+        currency = currency or DEFAULT_CURRENCY
+    if currency:
+        stmt = stmt.where(Job.currency == currency)
+    return stmt
+
+
+def get_jobs_page(search_id, after_id=None, limit=50, **salary):
+    link = search_query_jobs.c
+    stmt = (
+        db.select(Job)
+        .join(search_query_jobs, link.job_id == Job.id)
+        .where(link.search_query_id == search_id)
+        .order_by(link.job_id)
+        .limit(limit + 1)
+    )
+    stmt = filter_salary(stmt, **salary)
+    if after_id:
+        stmt = stmt.where(link.job_id > after_id)
+
+    jobs = db.session.execute(stmt).scalars().all()
+    next_after = jobs[limit - 1].id if len(jobs) > limit else None
+    return jobs[:limit], next_after
+
+
+def get_linked_jobs(search_id, after_seq=0, limit=100):
+    link = search_query_jobs.c
+    rows = db.session.execute(
+        db.select(Job, link.seq)
+        .join(search_query_jobs, link.job_id == Job.id)
+        .where(link.search_query_id == search_id, link.seq > after_seq)
+        .order_by(link.seq)
+        .limit(limit)
+    ).all()
+    return [job for job, _ in rows], (rows[-1].seq if rows else after_seq)
+
+
+def has_salary():
+    return case((Job.salary_from.isnot(None) | Job.salary_to.isnot(None), 1))
+
+
+def get_search_stats(search_id):
+    link = search_query_jobs.c
+    rub_midpoint = case(
+        (Job.currency == 'RUR', (func.coalesce(Job.salary_from, Job.salary_to)
+                                 + func.coalesce(Job.salary_to, Job.salary_from)) / 2.0)
+    )
+
+    total, with_salary, cities, avg_salary = db.session.execute(
+        db.select(
+            func.count(Job.id),
+            func.count(has_salary()),
+            func.count(func.distinct(Job.city)),
+            func.avg(rub_midpoint),
+        )
+        .join(search_query_jobs, link.job_id == Job.id)
+        .where(link.search_query_id == search_id)
+    ).one()
+
+    return {
+        'total': total,
+        'with_salary': with_salary,
+        'cities': cities,
+        'avg_salary': int(avg_salary) if avg_salary is not None else None,
+    }
+
+
+def iter_jobs_for_search(search_id, batch_size=500):
+    link = search_query_jobs.c
+    stmt = (
+        db.select(Job)
+        .join(search_query_jobs, link.job_id == Job.id)
+        .where(link.search_query_id == search_id)
+        .order_by(link.job_id)
+        .execution_options(yield_per=batch_size)
+    )
+    for job in db.session.execute(stmt).scalars():
+        yield job
+
+
+def get_export_version(search_id):
+    link = search_query_jobs.c
+    count, max_id, max_updated = db.session.execute(
+        db.select(func.count(Job.id), func.max(Job.id), func.max(Job.updated_at))
+        .join(search_query_jobs, link.job_id == Job.id)
+        .where(link.search_query_id == search_id)
+    ).one()
+    return count, max_id, max_updated
+
+
+def get_city_breakdown(search_id):
+    link = search_query_jobs.c
+    total = func.count(Job.id).label('total')
+
+    rows = db.session.execute(
+        db.select(Job.city, total, func.count(has_salary()).label('with_salary'))
+        .join(search_query_jobs, link.job_id == Job.id)
+        .where(link.search_query_id == search_id)
+        .group_by(Job.city)
+        .order_by(total.desc())
+    ).all()
+
+    return [{'city': city or 'Не указан', 'total': count, 'with_salary': with_salary}
+            for city, count, with_salary in rows]
@@ -0,0 +1,79 @@
+import multiprocessing
+import threading
+import time
+
+
+class TokenBucket:
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        with self._lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0
+            return (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill()
+            self.rate = float(rate)
+
+
+class SharedTokenBucket:
+
+    RATE, CAPACITY, TOKENS, UPDATED = range(4)
+
+    def __init__(self, rate, capacity=None, context=None):
+        context = context or multiprocessing.get_context()
+        capacity = float(capacity if capacity is not None else max(1, rate))
+        self._state = context.Array('d', [float(rate), capacity, capacity, time.monotonic()])
+
+    @property
+    def rate(self):
+        return self._state[self.RATE]
+
+    def _refill(self, state):
+        now = time.monotonic()
+        state[self.TOKENS] = min(state[self.CAPACITY],
+                                 state[self.TOKENS] + (now - state[self.UPDATED]) * state[self.RATE])
+        state[self.UPDATED] = now
+
+    def try_acquire(self, tokens=1):
+        with self._state.get_lock():
+            state = self._state
+            self._refill(state)
+            if state[self.TOKENS] >= tokens:
+                state[self.TOKENS] -= tokens
+                return 0
+            return (tokens - state[self.TOKENS]) / state[self.RATE]
+
+    def acquire(self, tokens=1):
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def set_rate(self, rate):
+        with self._state.get_lock():
+            self._refill(self._state)
+            self._state[self.RATE] = float(rate)
@@ -0,0 +1,99 @@
+import re
+
+NO_SALARY = 'Не указана'
+
+CURRENCY_SYMBOLS = {
+    'RUR': '₽',
+    'RUB': '₽',
+    'USD': '$',
+    'EUR': '€',
+    'KZT': '₸',
+    'UAH': '₴',
+    'BYR': 'Br',
+    'UZS': 'сум',
+}
+
+TEXT_CURRENCIES = [
+    ('₽', 'RUR'), ('руб', 'RUR'), ('rur', 'RUR'), ('rub', 'RUR'),
+    ('$', 'USD'), ('usd', 'USD'), ('€', 'EUR'), ('eur', 'EUR'),
+    ('₸', 'KZT'), ('kzt', 'KZT'), ('₴', 'UAH'), ('uah', 'UAH'),
+    ('br', 'BYR'), ('byr', 'BYR'), ('сум', 'UZS'), ('uzs', 'UZS'),
+]
+
+NUMBER_RE = re.compile(r'\d[\d\s  ]*')
+
+
+def parse_api_salary(salary):
+    if not salary or not isinstance(salary, dict):
+        return None, None, None, None
+    salary_from = salary.get('from')
+    salary_to = salary.get('to')
+    if salary_from is None and salary_to is None:
+        return None, None, None, None
+    return (
+        int(salary_from) if salary_from is not None else None,
+        int(salary_to) if salary_to is not None else None,
+        salary.get('currency') or 'RUR',
+        salary.get('gross'),
+    )
+
+
+def parse_salary_text(text):
+    if not text or text == NO_SALARY:
+        return None, None, None, None
+
+    lowered = text.lower()
+    numbers = [int(re.sub(r'\D', '', match)) for match in NUMBER_RE.findall(lowered)]
+    numbers = [number for number in numbers if number]
+    if not numbers:
+        return None, None, None, None
+
+    prefix = lowered[:NUMBER_RE.search(lowered).start()]
+    if len(numbers) >= 2:
+        salary_from, salary_to = numbers[0], numbers[1]
+    elif 'до' in prefix and 'от' not in prefix:
+        salary_from, salary_to = None, numbers[0]
+    else:
+        salary_from, salary_to = numbers[0], None
+
+    currency = next((code for token, code in TEXT_CURRENCIES if token in lowered), 'RUR')
+
+    gross = None
+    if 'до вычета' in lowered:
+        gross = True
+    elif 'на руки' in lowered:
+        gross = False
+
+    return salary_from, salary_to, currency, gross
+
+
+def _amount(value):
+    return f'{value:,}'.replace(',', ' ')
+
+
+def format_salary_range(salary_from, salary_to, currency=None, gross=None):
+    if salary_from is None and salary_to is None:
+        return None
+
+    symbol = CURRENCY_SYMBOLS.get(currency, currency or '₽')
+    if salary_from is not None and salary_to is not None and salary_from != salary_to:
+        text = f'{_amount(salary_from)} – {_amount(salary_to)} {symbol}'
+    elif salary_from is not None:
+        text = f'от {_amount(salary_from)} {symbol}' if salary_to is None else f'{_amount(salary_from)} {symbol}'
+    else:
+        text = f'до {_amount(salary_to)} {symbol}'
+
+    if gross is True:
+        text += ' до вычета налогов'
+    elif gross is False:
+        text += ' на руки'
+    return text
+
+
+def display_salary(salary_from, salary_to, currency=None, gross=None, fallback=None):
+    text = format_salary_range(salary_from, salary_to, currency, gross)
+    if text:
+        return text
+    if not fallback or fallback == NO_SALARY:
+        return 'Договорная'
+    return ' '.join(fallback.split())
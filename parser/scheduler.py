@@ -0,0 +1,221 @@
+import heapq
+import itertools
+import logging
+import threading
+import traceback
+from datetime import datetime
+
+from parser.models import db, SearchQuery
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SchedulerFull(Exception):
+    pass
+
+
+class SearchJob:
+
+    def __init__(self, search_id, query, city, max_pages, user_key=None, priority=0, full_crawl=False):
+        self.search_id = search_id
+        self.query = query
+        self.city = city
+        self.max_pages = max_pages
+        self.user_key = user_key or 'anonymous'
+        self.priority = priority
+        self.full_crawl = full_crawl
+
+    @property
+    def key(self):
+        return search_key(self.query, self.city, self.max_pages, self.full_crawl)
+
+    def __repr__(self):
+        return f'<SearchJob {self.search_id} {self.query!r}>'
+
+
+def search_key(query, city, max_pages, full_crawl=False):
+    return (
+        ' '.join((query or '').lower().split()),
+        ' '.join((city or '').lower().split()),
+        0 if full_crawl else int(max_pages or 0),
+        bool(full_crawl),
+    )
+
+
+class SearchScheduler:
+
+    def __init__(self, app, handler, max_workers=2, max_queue=100, progress=None, on_finish=None):
+        self.app = app
+        self.handler = handler
+        self.progress = progress
+        self.on_finish = on_finish
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max_queue
+
+        self._cond = threading.Condition()
+        self._queues = {}
+        self._last_served = {}
+        self._inflight = {}
+        self._pending = 0
+        self._seq = itertools.count()
+        self._workers = []
+        self._started = False
+
+    def start(self):
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._worker, name=f'search-worker-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+        logger.info(f"Планировщик поиска запущен, потоков: {self.max_workers}")
+        self.recover()
+
+    def recover(self):
+        with self.app.app_context():
+            searches = db.session.execute(
+                db.select(SearchQuery)
+                .where(SearchQuery.status.in_([SearchQuery.STATUS_QUEUED, SearchQuery.STATUS_RUNNING]))
+                .order_by(SearchQuery.created_at)
+            ).scalars().all()
+
+            jobs = []
+            for search in searches:
+                search.status = SearchQuery.STATUS_QUEUED
+                search.started_at = None
+                jobs.append(SearchJob(search.id, search.query, search.city, search.max_pages or 3,
+                                      search.user_key, search.priority or 0, bool(search.full_crawl)))
+            db.session.commit()
+
+        for job in jobs:
+            served_id = self._enqueue(job, force=True)
+            if served_id != job.search_id:
+                self._set_status(job.search_id, SearchQuery.STATUS_ERROR,
+                                 error=f'Объединён с поиском {served_id}', finished_at=datetime.utcnow())
+
+        if jobs:
+            logger.info(f"Восстановлено незавершённых поисков: {len(jobs)}")
+
+    def submit(self, job):
+        self.start()
+        return self._enqueue(job)
+
+    def _enqueue(self, job, force=False):
+        with self._cond:
+            existing = self._inflight.get(job.key)
+            if existing is not None:
+                logger.info(f"Поиск {job.search_id} объединён с выполняющимся {existing.search_id}")
+                return existing.search_id
+
+            if not force and self._pending >= self.max_queue:
+                raise SchedulerFull(f"Очередь поиска переполнена ({self.max_queue})")
+
+            queue = self._queues.setdefault(job.user_key, [])
+            heapq.heappush(queue, (-job.priority, next(self._seq), job))
+            self._inflight[job.key] = job
+            self._pending += 1
+            self._cond.notify()
+
+        if self.progress is not None:
+            self.progress.update(job.search_id, status=SearchQuery.STATUS_QUEUED)
+
+        return job.search_id
+
+    def find_inflight(self, query, city, max_pages, full_crawl=False):
+        with self._cond:
+            job = self._inflight.get(search_key(query, city, max_pages, full_crawl))
+            return job.search_id if job else None
+
+    def stats(self):
+        with self._cond:
+            return {
+                'workers': self.max_workers,
+                'pending': self._pending,
+                'inflight': len(self._inflight),
+                'users': len(self._queues),
+            }
+
+    def _next_job(self):
+        best_user = None
+        best_rank = None
+        for user, queue in self._queues.items():
+            rank = (queue[0][0], self._last_served.get(user, -1))
+            if best_rank is None or rank < best_rank:
+                best_user, best_rank = user, rank
+
+        queue = self._queues[best_user]
+        _, _, job = heapq.heappop(queue)
+        if not queue:
+            del self._queues[best_user]
+        self._last_served[best_user] = next(self._seq)
+        self._pending -= 1
+        return job
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queues:
+                    self._cond.wait()
+                job = self._next_job()
+
+            try:
+                self._run(job)
+            except Exception as e:
+                # ошибка записи статуса не должна останавливать поток: пул иначе тает до нуля
+                logger.error(f"Сбой обработки поиска {job.search_id} в планировщике: {e}")
+                traceback.print_exc()
+                if self.progress is not None:
+                    self.progress.finish(job.search_id, SearchQuery.STATUS_ERROR, str(e)[:1000])
+            finally:
+                with self._cond:
+                    self._inflight.pop(job.key, None)
+
+    def _set_status(self, search_id, status, **fields):
+        with self.app.app_context():
+            search = db.session.get(SearchQuery, search_id)
+            if search is None:
+                return False
+            search.status = status
+            for name, value in fields.items():
+                setattr(search, name, value)
+            db.session.commit()
+
+        # подписчики узнают о статусе только после коммита, иначе /results покажет старое состояние
+        if self.progress is not None:
+            if status in (SearchQuery.STATUS_DONE, SearchQuery.STATUS_ERROR):
+                self.progress.finish(search_id, status, fields.get('error'))
+            else:
+                self.progress.update(search_id, status=status)
+        return True
+
+    def _run(self, job):
+        if not self._set_status(job.search_id, SearchQuery.STATUS_RUNNING, started_at=datetime.utcnow()):
+            logger.error(f"Поиск {job.search_id} не найден в БД, задача отменена")
+            return
+
+        try:
+            self.handler(job)
+        except Exception as e:
+            logger.error(f"Ошибка выполнения поиска {job.search_id}: {e}")
+            traceback.print_exc()
+            self._set_status(job.search_id, SearchQuery.STATUS_ERROR,
+                             error=str(e)[:1000], finished_at=datetime.utcnow())
+            self._finished(job, SearchQuery.STATUS_ERROR)
+            return
+
+        self._set_status(job.search_id, SearchQuery.STATUS_DONE, finished_at=datetime.utcnow())
+        self._finished(job, SearchQuery.STATUS_DONE)
+
+    def _finished(self, job, status):
+        if self.on_finish is None:
+            return
+        try:
+            self.on_finish(job, status)
+        except Exception as e:
+            logger.error(f"Ошибка обработки завершения поиска {job.search_id}: {e}")
+            traceback.print_exc()
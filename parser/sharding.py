@@ -0,0 +1,132 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+
+from parser.hh_api_parser import PageFetchError, to_utc_naive
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEPTH_LIMIT = 2000
+PER_PAGE = 100
+MIN_WINDOW = timedelta(hours=1)
+EXPERIENCE_VALUES = ['noExperience', 'between1And3', 'between3And6', 'moreThan6']
+
+
+def _format_date(value):
+    return to_utc_naive(value).strftime('%Y-%m-%dT%H:%M:%S+0000')
+
+
+class Shard:
+
+    def __init__(self, date_from, date_to, filters=None):
+        self.date_from = date_from
+        self.date_to = date_to
+        self.filters = filters or {}
+
+    def split(self):
+        if self.date_to - self.date_from > MIN_WINDOW:
+            middle = self.date_from + (self.date_to - self.date_from) / 2
+            return [Shard(self.date_from, middle, self.filters), Shard(middle, self.date_to, self.filters)]
+
+        if 'experience' not in self.filters:
+            return [Shard(self.date_from, self.date_to, dict(self.filters, experience=value))
+                    for value in EXPERIENCE_VALUES]
+
+        return []
+
+    def __repr__(self):
+        filters = ''.join(f' {key}={value}' for key, value in self.filters.items())
+        return f'<Shard {self.date_from:%Y-%m-%d %H:%M} - {self.date_to:%Y-%m-%d %H:%M}{filters}>'
+
+
+class ShardedCrawler:
+
+    def __init__(self, client, max_workers=None, period_days=30):
+        self.client = client
+        self.max_workers = max_workers or client.max_workers
+        self.period_days = period_days
+
+    def search_vacancies(self, query, city=None, area_id=None):
+        all_vacancies = []
+        for vacancies in self.iter_pages(query, city, area_id=area_id):
+            all_vacancies.extend(vacancies)
+        return all_vacancies
+
+    def iter_pages(self, query, city=None, area_id=None):
+        if area_id is None:
+            area_id = self.client._get_city_id(city) if city else 1
+
+        now = datetime.utcnow() + timedelta(minutes=1)
+        root = Shard(now - timedelta(days=self.period_days), now)
+        seen = set()
+        shards = 0
+        truncated = 0
+
+        logger.info(f"Шардированный поиск: '{query}', город ID: {area_id}, период: {self.period_days} дн.")
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = {}
+
+        def submit(shard, page):
+            params = self._build_params(query, area_id, shard, page)
+            pending[executor.submit(self.client._get_page, params)] = (shard, page)
+
+        try:
+            submit(root, 0)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    shard, page = pending.pop(future)
+                    try:
+                        data = future.result()
+                    except PageFetchError:
+                        # пропущенный шард незаметно урезал бы полную выгрузку, поэтому она прерывается
+                        logger.error(f"{shard}: страница {page + 1} не получена, выгрузка прервана")
+                        raise
+
+                    if page == 0:
+                        found = data.get('found', 0)
+                        if found > DEPTH_LIMIT:
+                            children = shard.split()
+                            if children:
+                                for child in children:
+                                    submit(child, 0)
+                                continue
+                            truncated += 1
+                            logger.warning(f"{shard}: {found} вакансий, шард нельзя разделить дальше")
+
+                        shards += 1
+                        pages = min(data.get('pages', 1), DEPTH_LIMIT // PER_PAGE)
+                        for next_page in range(1, pages):
+                            submit(shard, next_page)
+
+                    vacancies = self._dedupe(self.client._parse_items(data.get('items', [])), seen)
+                    if vacancies:
+                        yield vacancies
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        logger.info(f"Шардированный поиск завершён: шардов {shards}, уникальных вакансий {len(seen)}, "
+                    f"обрезано шардов {truncated}")
+
+    def _build_params(self, query, area_id, shard, page):
+        params = self.client._build_params(query, area_id, page)
+        params.pop('period', None)
+        params['per_page'] = PER_PAGE
+        params['date_from'] = _format_date(shard.date_from)
+        params['date_to'] = _format_date(shard.date_to)
+        params.update(shard.filters)
+        return params
+
+    @staticmethod
+    def _dedupe(vacancies, seen):
+        unique = []
+        for vac in vacancies:
+            key = vac.get('hh_id') or vac.get('url')
+            if key in seen:
+                continue
+            seen.add(key)
+            unique.append(vac)
+        return unique
@@ -1,7 +1,25 @@
 import pandas as pd
+import csv
+import io
 import os
+import tempfile
 from datetime import datetime
+from urllib.parse import quote
 from flask import current_app
+from openpyxl import Workbook
+
+EXPORT_COLUMNS = [
+    ('Название', 40),
+    ('Компания', 30),
+    ('Зарплата', 20),
+    ('Город', 15),
+    ('Опыт работы', 15),
+    ('Тип занятости', 15),
+    ('Дата публикации', 15),
+    ('Ссылка', 40),
+    ('Описание', 50),
+    ('Ключевые навыки', 40),
+]
 
 
 def save_to_excel(vacancies, filename=None):
@@ -24,7 +42,7 @@ def save_to_excel(vacancies, filename=None):
 
         worksheet = writer.sheets['Вакансии']
         for column in df:
-            column_width = max(df[column].astype(str).map(len).max(), len(column))
+            column_width = max(df[column].map(lambda value: len(str(value))).max(), len(column))
             col_idx = df.columns.get_loc(column)
             worksheet.column_dimensions[chr(65 + col_idx)].width = min(column_width + 2, 50)
 
@@ -50,40 +68,43 @@ def save_to_csv(vacancies, filename=None):
     return filepath
 
 
-def format_salary(salary_str):
-    if not salary_str or salary_str == 'Не указана':
-        return 'Договорная'
+def iter_csv(rows, chunk_size=200):
+    headers = [name for name, _ in EXPORT_COLUMNS]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
 
-    salary_str = ' '.join(salary_str.split())
-    return salary_str
+    buffer.write('\ufeff')
+    writer.writerow(headers)
 
+    for i, row in enumerate(rows, 1):
+        writer.writerow([row.get(name, '') for name in headers])
+        if i % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
 
-def extract_salary_range(salary_str):
-    if not salary_str or salary_str == 'Не указана':
-        return (None, None, None)
+    yield buffer.getvalue()
 
-    import re
 
-    patterns = [
-        r'от (\d[\d\s]*)',  # от 100000
-        r'до (\d[\d\s]*)',  # до 100000
-        r'(\d[\d\s]*)[-–—](\d[\d\s]*)',  # 100000-150000
-    ]
+def write_excel_stream(rows, output=None, max_memory=5 * 1024 * 1024):
+    headers = [name for name, _ in EXPORT_COLUMNS]
 
-    salary_str = salary_str.replace(' ', '').replace('\xa0', '')
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Вакансии')
+    for col_idx, (_, width) in enumerate(EXPORT_COLUMNS):
+        worksheet.column_dimensions[chr(65 + col_idx)].width = width
 
-    for pattern in patterns:
-        match = re.search(pattern, salary_str)
-        if match:
-            if 'от' in pattern:
-                min_sal = int(match.group(1))
-                return (min_sal, None, 'руб')
-            elif 'до' in pattern:
-                max_sal = int(match.group(1))
-                return (None, max_sal, 'руб')
-            else:
-                min_sal = int(match.group(1))
-                max_sal = int(match.group(2))
-                return (min_sal, max_sal, 'руб')
+    worksheet.append(headers)
+    for row in rows:
+        worksheet.append([row.get(name, '') for name in headers])
 
-    return (None, None, None)
\ No newline at end of file
+    if output is None:
+        output = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def content_disposition(filename):
+    fallback = filename.encode('ascii', 'ignore').decode().replace('"', '').replace('\\', '') or 'download'
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
@@ -0,0 +1,243 @@
+import logging
+import threading
+import zlib
+from datetime import datetime, timedelta, time
+
+from parser.governor import CircuitOpen
+from parser.models import db, SearchQuery, Watchlist
+from parser.scheduler import SchedulerFull, search_key
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WATCHLIST_USER = 'watchlist'
+WATCHLIST_PRIORITY = -1
+
+# ежедневные и более редкие обновления переносятся в ночное окно
+OFF_PEAK_MIN_INTERVAL = timedelta(days=1)
+OFF_PEAK_MIN_GAP = timedelta(hours=6)
+MAX_SPREAD = timedelta(minutes=30)
+
+
+def watch_key(query, city, max_pages):
+    query_key, city_key, pages, _ = search_key(query, city or 'Москва', max_pages)
+    return f'{query_key}|{city_key}|{pages}'
+
+
+def parse_hours(value):
+    if not value:
+        return None
+    start, _, end = str(value).partition('-')
+    try:
+        start, end = int(start) % 24, int(end) % 24
+    except ValueError:
+        return None
+    return None if start == end else (start, end)
+
+
+def _key_offset(key, seconds):
+    if seconds <= 0:
+        return timedelta(0)
+    return timedelta(seconds=zlib.crc32(key.encode('utf-8')) % int(seconds))
+
+
+def next_refresh_at(key, refresh_minutes, now, off_peak=None):
+    interval = timedelta(minutes=refresh_minutes)
+    if not off_peak or interval < OFF_PEAK_MIN_INTERVAL:
+        spread = min(interval / 10, MAX_SPREAD)
+        return now + interval - _key_offset(key, spread.total_seconds())
+
+    start, end = off_peak
+    window = ((end - start) % 24) * 3600
+    earliest = now + max(interval - OFF_PEAK_MIN_INTERVAL, OFF_PEAK_MIN_GAP)
+    day = earliest.date() - timedelta(days=1)
+    while True:
+        slot = datetime.combine(day, time(start)) + _key_offset(key, window)
+        if slot >= earliest:
+            return slot
+        day += timedelta(days=1)
+
+
+def find_fresh_search(query, city, max_pages, max_age=None, now=None):
+    now = now or datetime.utcnow()
+    stmt = (
+        db.select(Watchlist)
+        .where(Watchlist.query_key == watch_key(query, city, max_pages),
+               Watchlist.active.is_(True),
+               Watchlist.last_search_id.is_not(None))
+        .order_by(Watchlist.last_refreshed_at.desc())
+    )
+    if max_age is not None:
+        # редкие обновления (раз в неделю) не должны подменять свежий поиск недельными результатами
+        stmt = stmt.where(Watchlist.last_refreshed_at > now - max_age)
+    watchlists = db.session.execute(stmt).scalars().all()
+
+    for watchlist in watchlists:
+        search = watchlist.last_search
+        if search is None or search.status != SearchQuery.STATUS_DONE:
+            continue
+        if watchlist.last_refreshed_at + timedelta(minutes=watchlist.refresh_minutes) > now:
+            return search
+    return None
+
+
+def add_watchlist(user_key, query, city, max_pages, refresh_minutes, search_id=None, off_peak=None):
+    key = watch_key(query, city, max_pages)
+    now = datetime.utcnow()
+
+    watchlist = db.session.execute(
+        db.select(Watchlist).where(Watchlist.user_key == user_key, Watchlist.query_key == key)
+    ).scalar()
+    if watchlist is None:
+        watchlist = Watchlist(user_key=user_key, query_key=key, query=' '.join(query.split()),
+                              city=city or 'Москва', max_pages=max_pages)
+        db.session.add(watchlist)
+
+    watchlist.active = True
+    watchlist.refresh_minutes = refresh_minutes
+    if search_id:
+        search = db.session.get(SearchQuery, search_id)
+        if search is not None and search.status == SearchQuery.STATUS_DONE:
+            watchlist.last_search_id = search.id
+            watchlist.last_refreshed_at = search.finished_at or now
+        else:
+            watchlist.pending_search_id = search_id
+        watchlist.next_refresh_at = next_refresh_at(key, refresh_minutes, now, off_peak)
+    elif watchlist.next_refresh_at is None:
+        watchlist.next_refresh_at = now
+
+    db.session.commit()
+    return watchlist
+
+
+def settle_refreshes(search_id=None):
+    stmt = (
+        db.select(Watchlist, SearchQuery)
+        .join(SearchQuery, SearchQuery.id == Watchlist.pending_search_id)
+        .where(SearchQuery.status.in_([SearchQuery.STATUS_DONE, SearchQuery.STATUS_ERROR]))
+    )
+    if search_id is not None:
+        stmt = stmt.where(Watchlist.pending_search_id == search_id)
+    else:
+        stmt = stmt.where(Watchlist.pending_search_id.is_not(None))
+
+    settled = 0
+    for watchlist, search in db.session.execute(stmt).all():
+        # неудачное обновление не затирает последние успешные результаты
+        if search.status == SearchQuery.STATUS_DONE:
+            watchlist.last_search_id = search.id
+            watchlist.last_refreshed_at = search.finished_at or datetime.utcnow()
+        else:
+            logger.info(f"Обновление списка '{watchlist.query}' завершилось ошибкой, "
+                        f"остаются результаты поиска {watchlist.last_search_id}")
+        watchlist.pending_search_id = None
+        settled += 1
+
+    if settled:
+        db.session.commit()
+    return settled
+
+
+class WatchlistRefresher:
+
+    def __init__(self, app, submit, scheduler=None, governor=None, tick_seconds=60, max_per_tick=5,
+                 off_peak=None):
+        self.app = app
+        self.submit = submit
+        self.scheduler = scheduler
+        self.governor = governor
+        self.tick_seconds = tick_seconds
+        self.max_per_tick = max_per_tick
+        self.off_peak = off_peak
+
+        self.refreshed = 0
+        self.coalesced = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name='watchlist-refresher', daemon=True)
+            self._thread.start()
+        logger.info(f"Обновление списков отслеживания запущено, проверка каждые {self.tick_seconds} с")
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.tick_seconds):
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Ошибка обновления списков отслеживания: {e}")
+
+    def capacity(self):
+        capacity = self.max_per_tick
+        if self.scheduler is not None:
+            stats = self.scheduler.stats()
+            capacity = min(capacity, stats['workers'] - stats['pending'])
+        return max(0, capacity)
+
+    def tick(self, now=None):
+        now = now or datetime.utcnow()
+
+        if self.governor is not None:
+            try:
+                self.governor.check()
+            except CircuitOpen as e:
+                logger.info(f"Обновление списков отложено: {e}")
+                return 0
+
+        capacity = self.capacity()
+        if not capacity:
+            return 0
+
+        with self.app.app_context():
+            settle_refreshes()
+
+            keys = db.session.execute(
+                db.select(Watchlist.query_key)
+                .where(Watchlist.active.is_(True), Watchlist.next_refresh_at <= now)
+                .group_by(Watchlist.query_key)
+                .order_by(db.func.min(Watchlist.next_refresh_at))
+                .limit(capacity)
+            ).scalars().all()
+
+            submitted = 0
+            for key in keys:
+                group = db.session.execute(
+                    db.select(Watchlist).where(Watchlist.query_key == key, Watchlist.active.is_(True))
+                ).scalars().all()
+                if not group:
+                    continue
+
+                try:
+                    search_id = self.submit(group[0])
+                except (SchedulerFull, CircuitOpen) as e:
+                    logger.info(f"Обновление списков отложено: {e}")
+                    break
+
+                for watchlist in group:
+                    watchlist.pending_search_id = search_id
+                    watchlist.next_refresh_at = next_refresh_at(key, watchlist.refresh_minutes, now,
+                                                                self.off_peak)
+                db.session.commit()
+
+                submitted += 1
+                self.refreshed += 1
+                self.coalesced += len(group) - 1
+                logger.info(f"Список отслеживания '{group[0].query}' ({group[0].city}) обновляется, "
+                            f"поиск {search_id}, подписчиков: {len(group)}")
+
+        return submitted
+
+    def stats(self):
+        return {
+            'running': self._thread is not None and not self._stop.is_set(),
+            'refreshed': self.refreshed,
+            'coalesced': self.coalesced,
+            'off_peak': self.off_peak,
+        }
@@ -0,0 +1,184 @@
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+# аудит идёт на временной БД с тестовым поиском, рабочая база и выгрузки не затрагиваются
+AUDIT_DIR = tempfile.mkdtemp(prefix='query-audit-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(AUDIT_DIR, 'audit.db')}"
+os.environ['ANALYTICS_PATH'] = os.path.join(AUDIT_DIR, 'analytics')
+os.environ['HH_CACHE_BACKEND'] = 'none'
+os.environ['BACKGROUND_WORKERS'] = '0'
+
+from sqlalchemy import event
+
+from app import app, export_cache, scheduler, save_search_pages, finish_search
+from parser.enrichment import select_pending
+from parser.incremental import get_watermark
+from parser.models import db, SearchQuery
+from parser.queries import get_city_breakdown
+from parser.scheduler import SearchJob
+from parser.watchlists import WatchlistRefresher, add_watchlist, find_fresh_search, WATCHLIST_USER
+
+ALLOWED_SCANS = [
+    # проверка соединения при старте и выборки с LIMIT без фильтра
+    re.compile(r'^SELECT .* FROM search_queries\s+LIMIT', re.S),
+]
+
+AUDITED_STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+
+SCAN_RE = re.compile(r'^SCAN (?!CONSTANT ROW)(\w+)\b(?! USING (?:COVERING )?INDEX| VIRTUAL TABLE INDEX)')
+
+AUDIT_USER = 'query-audit'
+MSK = timezone(timedelta(hours=3))
+
+
+def capture_statements(actions):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(AUDITED_STATEMENTS) and not executemany:
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            actions()
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    unique = {}
+    for statement, parameters in statements:
+        unique.setdefault(statement, parameters)
+    return list(unique.items())
+
+
+def explain(statement, parameters):
+    with app.app_context():
+        conn = db.engine.raw_connection()
+        try:
+            rows = conn.cursor().execute(f'EXPLAIN QUERY PLAN {statement}', parameters or ()).fetchall()
+        finally:
+            conn.close()
+    return [row[-1] for row in rows]
+
+
+def find_scans(plan):
+    return [line for line in plan if SCAN_RE.match(line)]
+
+
+def fixture_vacancies(prefix, count, now):
+    cities = ['Москва', 'Санкт-Петербург', 'Казань']
+    return [{
+        'hh_id': f'{prefix}{n:04d}',
+        'title': f'Python разработчик {n}',
+        'company': f'Компания {n % 7}',
+        'city': cities[n % len(cities)],
+        'url': f'https://hh.ru/vacancy/{prefix}{n:04d}',
+        'salary_from': 100000 + n * 1000 if n % 2 else None,
+        'salary_to': 150000 + n * 1000 if n % 3 else None,
+        'currency': 'RUR',
+        'published_at': now - timedelta(hours=n),
+        'description': 'Опыт работы с SQL и Docker',
+    } for n in range(count)]
+
+
+def seed_searches(now):
+    with app.app_context():
+        searches = [SearchQuery(query='python', city='Москва', max_pages=1, user_key=AUDIT_USER,
+                                status=SearchQuery.STATUS_RUNNING, started_at=datetime.utcnow())
+                    for _ in range(2)]
+        db.session.add_all(searches)
+        db.session.commit()
+        first_id, second_id = [search.id for search in searches]
+
+    # первый поиск ставит водяной знак, второй идёт инкрементально от него
+    save_search_pages(SearchJob(first_id, 'python', 'Москва', 1), [fixture_vacancies('1', 40, now)], 1, None)
+    with app.app_context():
+        date_from = get_watermark('python', 1, 1).newest_published_at
+    save_search_pages(SearchJob(second_id, 'python', 'Москва', 1), [fixture_vacancies('2', 10, now)], 1,
+                      date_from)
+
+    for search_id in (first_id, second_id):
+        scheduler._set_status(search_id, SearchQuery.STATUS_DONE, finished_at=datetime.utcnow())
+        finish_search(SearchJob(search_id, 'python', 'Москва', 1, user_key=WATCHLIST_USER),
+                      SearchQuery.STATUS_DONE)
+    scheduler.recover()
+    return first_id, second_id
+
+
+def exercise_watchlists(search_id):
+    refresher = WatchlistRefresher(app, lambda watchlist: search_id)
+    with app.app_context():
+        add_watchlist(AUDIT_USER, 'python', 'Москва', 1, 60, search_id)
+        add_watchlist(f'{AUDIT_USER}-2', 'java', 'Казань', 1, 60)
+        find_fresh_search('python', 'Москва', 1, timedelta(minutes=app.config['WATCHLIST_REUSE_MAX_MINUTES']))
+    refresher.tick(datetime.utcnow() + timedelta(minutes=1))
+    refresher.tick(datetime.utcnow() + timedelta(minutes=1))
+
+
+def exercise_app():
+    app.testing = True
+    export_cache.folder = os.path.join(AUDIT_DIR, 'downloads')
+    os.makedirs(export_cache.folder, exist_ok=True)
+    client = app.test_client()
+
+    first_id, second_id = seed_searches(datetime.now(MSK))
+    exercise_watchlists(second_id)
+
+    with app.app_context():
+        get_city_breakdown(first_id)
+        select_pending(first_id, timedelta(days=7))
+
+    requests = [
+        '/history',
+        '/search?q=python&salary_min=100000',
+        '/search?q=разработчики&city=Казань&salary_max=200000',
+        '/api/jobs/search?q=python&currency=RUR',
+        f'/results/{first_id}',
+        f'/results/{first_id}?salary_min=120000',
+        f'/results/{first_id}/events',
+        f'/api/results/{first_id}?after=1',
+        f'/api/search/{first_id}',
+        f'/api/search/{first_id}/results',
+        f'/api/search/{second_id}/stream',
+        f'/download/{first_id}?format=csv',
+        f'/download/{first_id}?format=excel',
+        '/api/hh/status',
+        '/api/analytics/salaries?query=python',
+        '/api/analytics/volume?query=python',
+        '/api/analytics/employers?query=python',
+        '/api/analytics/status',
+    ]
+    for path in requests:
+        client.get(path).get_data()
+    client.get('/watchlists', environ_base={'REMOTE_ADDR': AUDIT_USER}).get_data()
+
+
+def audit(actions=exercise_app):
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        print(" Аудит планов запросов поддерживается только для SQLite")
+        return 2
+
+    failures = 0
+    statements = capture_statements(actions)
+    for statement, parameters in statements:
+        plan = explain(statement, parameters)
+        scans = find_scans(plan)
+        allowed = any(pattern.search(statement) for pattern in ALLOWED_SCANS)
+        status = 'OK' if not scans or allowed else 'SCAN'
+        if status == 'SCAN':
+            failures += 1
+
+        print(f"[{status}] {' '.join(statement.split())[:150]}")
+        for line in plan:
+            print(f"        {line}")
+
+    print(f"\n Проверено запросов: {len(statements)}, с полным сканированием: {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(audit())